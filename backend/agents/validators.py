@@ -0,0 +1,129 @@
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.schemas import PeticaoAIOutput, ApontamentoRevisao
+
+# Regras determinísticas aplicadas entre o Editor e o Revisor. Cada regra recebe o
+# rascunho e devolve (rascunho, apontamentos): pode corrigir o rascunho localmente
+# ou reprovar com apontamentos por campo, que seguem direto para o Revisador sem
+# gastar uma chamada do Revisor (LLM).
+Validator = Callable[[PeticaoAIOutput], Tuple[PeticaoAIOutput, List[ApontamentoRevisao]]]
+
+VALIDATORS: List[Tuple[str, Validator]] = []
+
+# Documentos que o sistema já insere sozinho na petição (ver prompt do Writer)
+PROVAS_AUTOMATICAS = ('certidao de nascimento', 'titulo de eleitor', 'certidao eleitoral')
+_H3 = re.compile(r'<h3[\s>]', re.IGNORECASE)
+
+
+def validator(name: str):
+    """Registra uma regra em VALIDATORS (executadas na ordem de registro)."""
+    def register(fn: Validator) -> Validator:
+        VALIDATORS.append((name, fn))
+        return fn
+    return register
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+# --- Regras ---
+
+@validator('resumo_vazio')
+def resumo_vazio(draft: PeticaoAIOutput):
+    if (draft.resumo_fatos or '').strip():
+        return draft, []
+    return draft, [ApontamentoRevisao(campo='resumo_fatos', problema='O resumo dos fatos está vazio.')]
+
+
+@validator('preliminares_vazias')
+def preliminares_vazias(draft: PeticaoAIOutput):
+    if (draft.preliminares or '').strip():
+        return draft, []
+    return draft, [ApontamentoRevisao(
+        campo='preliminares', problema="O campo 'preliminares' não pode ser vazio: use a Estratégia Processual."
+    )]
+
+
+@validator('preliminares_sem_h3')
+def preliminares_sem_h3(draft: PeticaoAIOutput):
+    if not (draft.preliminares or '').strip() or _H3.search(draft.preliminares):
+        return draft, []
+    return draft, [ApontamentoRevisao(
+        campo='preliminares', problema='Cada preliminar precisa de um título <h3>I.1 – TÍTULO</h3>.'
+    )]
+
+
+@validator('provas_automaticas')
+def provas_automaticas(draft: PeticaoAIOutput):
+    """Remove documentos inseridos pelo sistema e provas repetidas (correção local)."""
+    kept, seen = [], set()
+    for prova in draft.lista_provas:
+        key = _normalize(prova)
+        if not key or key in seen or any(doc in key for doc in PROVAS_AUTOMATICAS):
+            continue
+        seen.add(key)
+        kept.append(prova.strip())
+    if kept == draft.lista_provas:
+        return draft, []
+    return draft.model_copy(update={'lista_provas': kept}), []
+
+
+# --- Execução e contadores ---
+
+class ValidatorStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.passed = 0
+        self.rejected = 0
+        self.fixed = 0
+        self.by_rule: Dict[str, Dict[str, int]] = {}
+
+    def record(self, fixed: List[str], rejected: List[str]):
+        with self._lock:
+            self.runs += 1
+            if rejected:
+                self.rejected += 1
+            else:
+                self.passed += 1
+            if fixed:
+                self.fixed += 1
+            for kind, names in (('fixed', fixed), ('rejected', rejected)):
+                for name in names:
+                    rule = self.by_rule.setdefault(name, {'fixed': 0, 'rejected': 0})
+                    rule[kind] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'passed': self.passed,
+                'rejected': self.rejected,
+                'fixed': self.fixed,
+                # cada rascunho reprovado localmente é uma chamada do Revisor a menos
+                'llm_reviews_avoided': self.rejected,
+                'by_rule': {name: dict(counts) for name, counts in self.by_rule.items()},
+            }
+
+
+validator_stats = ValidatorStats()
+
+
+def run_validators(draft: PeticaoAIOutput, validators: Optional[List[Tuple[str, Validator]]] = None):
+    """Aplica as regras em sequência. Retorna (rascunho corrigido, apontamentos, regras que corrigiram)."""
+    findings, fixed, rejected = [], [], []
+    for name, rule in (VALIDATORS if validators is None else validators):
+        new_draft, rule_findings = rule(draft)
+        if new_draft is not draft:
+            fixed.append(name)
+            draft = new_draft
+        if rule_findings:
+            rejected.append(name)
+            findings.extend(rule_findings)
+    validator_stats.record(fixed, rejected)
+    return draft, findings, fixed
@@ -1,18 +1,29 @@
 import os
+import json
+import asyncio
 import operator
+import time
 from typing import Annotated, List, TypedDict, Union, Optional
 from dotenv import load_dotenv
 
 # Imports do LangChain/LangGraph
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
 
 # Imports do seu projeto existente
-from models.schemas import PeticaoAIOutput, DadosTecnicos, CorrecaoItem
-from services.search import search_jurisprudence
+from models.schemas import (
+    PeticaoAIOutput, DadosTecnicos, CorrecaoItem, EdicaoTexto, EditorOutput, CAMPOS_EDITAVEIS,
+    ApontamentoRevisao, RevisorOutput, ReescritaOutput, CAMPOS_REVISAVEIS
+)
+from services.search import search_relevant_jurisprudence
 from services.calculations import generate_payment_table
+from services.llm_cache import llm_cache
+from services.tokens import count_tokens, fit_sections, merge_usage, record_usage, trim_lines
+from agents.validators import run_validators
+from services.metrics import llm_call_duration, timed_node
+from services.tracing import annotate, span, traced
 
 load_dotenv()
 
@@ -28,63 +39,121 @@ class AgentState(TypedDict):
     
     draft: Optional[PeticaoAIOutput]
     review_comments: str
+    # apontamentos do Revisor por campo; o Revisador reescreve só esses campos
+    review_findings: List[ApontamentoRevisao]
+    # campos alterados na última reescrita (None = rascunho inteiro, vindo do Writer)
+    revised_fields: Optional[List[str]]
     quality_score: int
     revision_count: int
     legal_strategy: Optional[str]
+    bypass_cache: bool
+    # uso de tokens por nó (somado entre as iterações e ramos paralelos)
+    token_usage: Annotated[dict, merge_usage]
 
 # CONFIGURAÇÃO DO MODELO
 llm = ChatOpenAI(model="gpt-4o", temperature=0)
+# Tempo máximo de cada chamada ao LLM (inclui as retentativas do cliente)
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '120'))
+
+# Orçamento de tokens do prompt do Writer (total e por seção; ver services/tokens.py)
+WRITER_PROMPT_BUDGET = int(os.getenv('WRITER_PROMPT_BUDGET', '6000'))
+WRITER_SECTION_BUDGETS = {
+    "input": int(os.getenv('WRITER_INPUT_TOKENS', '2500')),
+    "strategy": int(os.getenv('WRITER_STRATEGY_TOKENS', '800')),
+    "calcs": int(os.getenv('WRITER_CALCS_TOKENS', '300')),
+    "feedback": int(os.getenv('WRITER_FEEDBACK_TOKENS', '800')),
+    "research": int(os.getenv('WRITER_RESEARCH_TOKENS', '1500')),
+}
+# Cada jurisprudência (uma linha) é cortada neste tamanho antes do orçamento da seção
+RESEARCH_LINE_TOKENS = int(os.getenv('WRITER_RESEARCH_LINE_TOKENS', '250'))
+
+# Orçamento do prompt do Revisador (reescrita só dos campos apontados)
+REVISER_PROMPT_BUDGET = int(os.getenv('REVISER_PROMPT_BUDGET', '3000'))
+REVISER_SECTION_BUDGETS = {
+    "fields": int(os.getenv('REVISER_FIELDS_TOKENS', '1200')),
+    "findings": int(os.getenv('REVISER_FINDINGS_TOKENS', '500')),
+    "input": int(os.getenv('REVISER_INPUT_TOKENS', '1200')),
+    "strategy": int(os.getenv('REVISER_STRATEGY_TOKENS', '800')),
+}
+
+async def call_llm(node: str, messages, schema=None, bypass: bool = False):
+    """Chamada assíncrona ao LLM (via cache) com timeout por chamada.
+
+    Retorna (resposta, uso de tokens); o uso também vai para o log/estatísticas.
+    """
+    started = time.perf_counter()
+    async with span(f"llm.{node}", schema=getattr(schema, "__name__", None), bypass=bypass):
+        try:
+            result, usage = await asyncio.wait_for(
+                llm_cache.ainvoke_with_usage(llm, messages, schema=schema, bypass=bypass),
+                timeout=LLM_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"LLM excedeu {LLM_TIMEOUT_SECONDS:g}s no nó '{node}'")
+        finally:
+            llm_call_duration.observe(time.perf_counter() - started, node=node)
+        annotate(**usage)
+    record_usage(node, usage)
+    return result, usage
 
 # --- 2. AGENTES (NÓS DO GRAFO) ---
 
-# 🧠 ORQUESTRADOR
-def orchestrator_node(state: AgentState):
-    print("🤖 [ORCHESTRATOR] Analisando estado do processo...")
-    
+# 🧭 ROTEAMENTO (sem nó orquestrador: decisões puras sobre o estado)
+PREPARATION_NODES = ("researcher", "strategist", "calculator")
+MAX_REVISIONS = 2
+
+def route_preparation(state: AgentState) -> List[str]:
+    """Nós de preparação que faltam rodar; todos seguem em paralelo até o Writer."""
+    pending = []
     res = state.get("research_results", "")
     if not res or len(str(res).strip()) < 10:
-        return {"next": "researcher"}
-    
-    # Se não tiver estratégia definida, passa pelo Strategist
+        pending.append("researcher")
     if not state.get("legal_strategy"):
-        return {"next": "strategist"}
-    
+        pending.append("strategist")
     calc = state.get("calc_results", "")
     if not calc or len(str(calc).strip()) < 5:
-        return {"next": "calculator"}
-        
-    if not state.get("draft"):
-        return {"next": "writer"}
-        
+        pending.append("calculator")
+    print(f"🧭 [ROUTER] Preparação: {', '.join(pending) or 'nada pendente'}")
+    return pending or ["writer"]
+
+def route_after_validation(state: AgentState) -> str:
+    """Reprovado pelas regras locais: vai direto ao Revisador (sem chamar o Revisor)."""
+    if not state.get("review_findings"):
+        return "reviewer"
+    if state.get("revision_count", 0) < MAX_REVISIONS:
+        print(f"   🔄 Regras locais reprovaram. Reescrevendo campos apontados. Tentativa {state.get('revision_count', 0)+1}/{MAX_REVISIONS}")
+        return "reviser"
+    print("   ⚠️ Limite de reescritas atingido com regras locais pendentes.")
+    return END
+
+def route_after_review(state: AgentState) -> str:
     score = state.get("quality_score", 0)
-    
-    # Lógica de fluxo: Writer -> Editor -> Reviewer
-    # Como não temos uma flag explícita de "editado", podemos usar o fluxo do grafo.
-    # Mas para simplificar a decisão aqui:
-    # O grafo abaixo forçará: Writer -> Editor -> Reviewer.
-    # O Orquestrador só decide o loop de repetição.
-    
-    if score == 0:
-        return {"next": "reviewer"}
-        
     rev_count = state.get("revision_count", 0)
-    if score < 8 and rev_count < 2:
-        print(f"   🔄 Nota baixa ({score}). Solicitando reescrita. Tentativa {rev_count+1}/2")
-        return {"next": "writer"}
-        
+    if score < 8 and rev_count < MAX_REVISIONS:
+        print(f"   🔄 Nota baixa ({score}). Reescrevendo campos apontados. Tentativa {rev_count+1}/{MAX_REVISIONS}")
+        return "reviser"
     print("   ✅ Processo concluído com sucesso.")
-    return {"next": "END"}
+    return END
+
+def route_after_revision(state: AgentState) -> str:
+    """Sem nenhum campo reescrito o rascunho é o mesmo: revisar de novo daria o mesmo veredito."""
+    if state.get("revised_fields"):
+        return "editor"
+    print("   ⚠️ Revisador não devolveu nenhum campo. Mantendo o rascunho atual.")
+    return END
 
 # 📚 PESQUISADOR
 async def researcher_node(state: AgentState):
     print("🔎 [RESEARCHER] Buscando jurisprudência...")
-    query = f"{state['doc_type']} {state['input_text'][:50]}"
-    results = await search_jurisprudence(query)
+    # BM25 traz candidatos pelos fatos do caso; o re-ranking escolhe os 3 mais próximos e diversos
+    details = (state.get("client_data") or {}).get("details") or state["input_text"]
+    query = f"{state['doc_type']} {details}"[:1000]
+    results = await search_relevant_jurisprudence(query, facts=f"{state['input_text']}\n{details}", k=3)
     formatted_results = "\n".join([f"- {r['title']}: {r['snippet']}" for r in results])
     return {"research_results": formatted_results or "Nenhuma jurisprudência encontrada."}
 
 # ♟️ ESTRATEGISTA (NOVO)
-def strategist_node(state: AgentState):
+async def strategist_node(state: AgentState):
     print("♟️ [STRATEGIST] Definindo estratégia processual...")
     
     input_text = state.get("input_text", "").lower()
@@ -129,7 +198,7 @@ def strategist_node(state: AgentState):
     return {"legal_strategy": strategy_text}
 
 # 🧮 CALCULISTA
-def calculator_node(state: AgentState):
+async def calculator_node(state: AgentState):
     print("💰 [CALCULATOR] Processando valores...")
     c_data = state.get("client_data", {})
     birth_date = c_data.get("child_birth_date") or "2024-01-01"
@@ -138,7 +207,7 @@ def calculator_node(state: AgentState):
     return {"calc_results": summary}
 
 # ✍️ ESCRITOR (JURÍDICO)
-def writer_node(state: AgentState):
+async def writer_node(state: AgentState):
     print("✍️ [WRITER] Redigindo a petição...")
     
     feedback = state.get("review_comments", "")
@@ -159,9 +228,6 @@ def writer_node(state: AgentState):
 
     system_prompt = f"""{base_prompt}
     
-    {data_correction_instruction}
-
-    
     {data_correction_instruction}
 
     Contexto Jurídico: {{research}}
@@ -189,31 +255,66 @@ def writer_node(state: AgentState):
         ("human", "Caso: {input}\nTipo: {doc_type}")
     ])
     
-    structured_llm = llm.with_structured_output(PeticaoAIOutput)
-    chain = prompt | structured_llm
-    
-    result = chain.invoke({
-        "research": state.get("research_results"),
-        "strategy": state.get("legal_strategy"),
-        "calcs": state.get("calc_results"),
-        "calcs": state.get("calc_results"),
-        "feedback": feedback,
-        "input": state["input_text"],
-        "doc_type": state["doc_type"]
-    })
+    # Orçamento: seções em ordem de prioridade; o excesso sai primeiro da jurisprudência
+    research = trim_lines(state.get("research_results"), WRITER_SECTION_BUDGETS["research"], RESEARCH_LINE_TOKENS)
+    fixed = count_tokens(system_prompt) + count_tokens(state["doc_type"])
+    sections, counts = fit_sections([
+        ("input", state["input_text"], WRITER_SECTION_BUDGETS["input"]),
+        ("strategy", state.get("legal_strategy"), WRITER_SECTION_BUDGETS["strategy"]),
+        ("calcs", state.get("calc_results"), WRITER_SECTION_BUDGETS["calcs"]),
+        ("feedback", feedback, WRITER_SECTION_BUDGETS["feedback"]),
+        ("research", research, WRITER_SECTION_BUDGETS["research"]),
+    ], total_budget=max(WRITER_PROMPT_BUDGET - fixed, 0))
+    print(f"   📏 Prompt por seção: {counts} + fixo {fixed} = {sum(counts.values()) + fixed} tokens")
+
+    messages = prompt.format_messages(
+        research=sections["research"],
+        strategy=sections["strategy"],
+        calcs=sections["calcs"],
+        feedback=sections["feedback"],
+        input=sections["input"],
+        doc_type=state["doc_type"]
+    )
+    # temperature=0: o mesmo prompt é servido pelo cache (services/llm_cache.py)
+    result, usage = await call_llm("writer", messages, schema=PeticaoAIOutput, bypass=state.get("bypass_cache", False))
     
     return {
         "draft": result,
         "revision_count": state.get("revision_count", 0) + 1,
         "quality_score": 0,
-        "review_comments": "" 
+        "review_comments": "",
+        "review_findings": [],
+        "revised_fields": None,
+        "token_usage": {"writer": usage}
     }
 
 # 📝 AGENTE NOVO: EDITOR (GRAMÁTICA E ESTILO)
-def editor_node(state: AgentState):
+def apply_edits(draft: PeticaoAIOutput, edits: List[EdicaoTexto]):
+    """Aplica as substituições do Editor no rascunho. Edições cujo 'original' não
+    está no texto atual são ignoradas. Retorna (rascunho, aplicadas, ignoradas)."""
+    fields = {campo: getattr(draft, campo) or "" for campo in CAMPOS_EDITAVEIS}
+    applied = skipped = 0
+    for edit in edits:
+        text = fields.get(edit.campo, "")
+        if edit.original and edit.original in text:
+            fields[edit.campo] = text.replace(edit.original, edit.correto, 1)
+            applied += 1
+        else:
+            skipped += 1
+    changed = {campo: value for campo, value in fields.items() if value != (getattr(draft, campo) or "")}
+    return draft.model_copy(update=changed), applied, skipped
+
+async def editor_node(state: AgentState):
     print("E [EDITOR] Revisando gramática e estilo...")
     
     draft = state["draft"]
+    # Depois de uma reescrita pontual, só os campos de texto reescritos voltam ao Editor
+    revised = state.get("revised_fields")
+    campos = CAMPOS_EDITAVEIS if revised is None else [c for c in CAMPOS_EDITAVEIS if c in revised]
+    prose = {campo: getattr(draft, campo) for campo in campos if getattr(draft, campo)}
+    if not prose:
+        print("   ⏭️ Nenhum texto novo para revisar.")
+        return {}
     
     # Prompt focado puramente na língua portuguesa
     system_prompt = """Você é um Revisor Gramatical implacável de um escritório de advocacia de alto nível.
@@ -223,104 +324,158 @@ def editor_node(state: AgentState):
     3. Substituição de termos repetitivos por sinônimos elegantes.
     4. Clareza e coesão textual.
     
-    NÃO altere os fatos, datas ou valores. Apenas a forma do texto.
-    Retorne o MESMO objeto JSON, mas com os campos de texto ('resumo_fatos') aprimorados.
+    NÃO altere os fatos, datas ou valores. Apenas a forma do texto. Preserve as tags HTML.
+    Responda SOMENTE com a lista 'edicoes': cada item indica o 'campo', o trecho 'original'
+    (copiado literalmente do texto, curto, mas único no campo) e o trecho 'correto'.
+    Se nada precisar mudar, devolva a lista vazia.
     """
     
-    # Criamos um prompt que recebe o objeto Draft e pede o mesmo objeto de volta, mas melhorado
+    # Só os campos de texto corrido vão para o modelo; o resto do rascunho não muda
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
-        ("human", "Corrija este rascunho: {draft_json}")
+        ("human", "Revise estes campos: {prose_json}")
     ])
     
-    structured_llm = llm.with_structured_output(PeticaoAIOutput)
-    chain = prompt | structured_llm
+    messages = prompt.format_messages(prose_json=json.dumps(prose, ensure_ascii=False))
+    output, usage = await call_llm("editor", messages, schema=EditorOutput, bypass=state.get("bypass_cache", False))
     
-    # Passamos o dump do modelo atual para ele reescrever
-    improved_draft = chain.invoke({
-        "draft_json": draft.model_dump_json()
-    })
+    improved_draft, applied, skipped = apply_edits(draft, output.edicoes)
+    print(f"   ✏️ Edições aplicadas: {applied} (ignoradas: {skipped})")
     
-    return {"draft": improved_draft}
+    return {"draft": improved_draft, "token_usage": {"editor": usage}}
+
+# 🚦 VALIDADOR (REGRAS LOCAIS, SEM LLM; ver agents/validators.py)
+async def validator_node(state: AgentState):
+    print("🚦 [VALIDATOR] Conferindo regras do rascunho...")
+    draft, findings, fixed = run_validators(state["draft"])
+    if fixed:
+        print(f"   🔧 Corrigido localmente: {', '.join(fixed)}")
+    update = {"draft": draft, "review_findings": findings}
+    if findings:
+        print(f"   ❌ Regras reprovaram: {', '.join(sorted({f.campo for f in findings}))} (Revisor não será chamado)")
+        update["quality_score"] = 5
+        update["review_comments"] = "\n".join(f"- [{f.campo}] {f.problema}" for f in findings)
+    return update
 
 # 🕵️ REVISOR (JURÍDICO)
-def reviewer_node(state: AgentState):
+async def reviewer_node(state: AgentState):
     print("⚖️ [REVIEWER] Analisando qualidade jurídica...")
     
     draft = state["draft"]
     
     check_prompt = ChatPromptTemplate.from_messages([
         ("system", """Você é um Juiz Federal rigoroso. Analise o resumo dos fatos e provas.
-        Se estiver bom, responda apenas 'APROVADO'.
-        Se estiver ruim, incompleto ou alucinado, liste os erros resumidamente."""),
+        Se estiver bom, responda aprovado=true e nenhum apontamento.
+        Se estiver ruim, incompleto ou alucinado, responda aprovado=false e liste cada erro
+        resumidamente em 'apontamentos', indicando o campo ('resumo_fatos' ou 'lista_provas')."""),
         ("human", f"Resumo: {draft.resumo_fatos}\nProvas: {draft.lista_provas}")
     ])
     
-    response = llm.invoke(check_prompt.format_messages())
-    content = response.content.strip()
+    review, usage = await call_llm("reviewer", check_prompt.format_messages(), schema=RevisorOutput,
+                                   bypass=state.get("bypass_cache", False))
     
-    if "APROVADO" in content.upper():
+    if review.aprovado and not review.apontamentos:
         score = 10
-        comments = ""
+        findings = []
     else:
         score = 5 
-        comments = content
-        print(f"   ❌ Crítica encontrada: {comments[:50]}...")
+        findings = review.apontamentos
+        if not findings:
+            # reprovou sem dizer onde: o resumo é o campo que o Revisor de fato lê
+            findings = [ApontamentoRevisao(campo="resumo_fatos", problema="Revisor reprovou sem detalhar o erro.")]
+        print(f"   ❌ Crítica encontrada em: {', '.join(sorted({f.campo for f in findings}))}")
+    comments = "\n".join(f"- [{f.campo}] {f.problema}" for f in findings)
         
     return {
         "quality_score": score, 
-        "review_comments": comments
+        "review_comments": comments,
+        "review_findings": findings,
+        "token_usage": {"reviewer": usage}
     }
 
-# --- 3. MONTAGEM DO GRAFO ---
-
-workflow = StateGraph(AgentState)
+# 🩹 REVISADOR: reescreve só os campos apontados, reaproveitando o resto do rascunho
+async def reviser_node(state: AgentState):
+    draft = state["draft"]
+    findings = state.get("review_findings") or []
+    campos = [c for c in CAMPOS_REVISAVEIS if any(f.campo == c for f in findings)]
+    print(f"🩹 [REVISER] Reescrevendo: {', '.join(campos)}")
+
+    system_prompt = """Você é um Advogado Previdenciário Sênior corrigindo uma petição já redigida.
+    Reescreva APENAS os campos listados em 'Campos a reescrever', resolvendo os apontamentos do Revisor.
+    Use somente os fatos do caso; não invente dados. Deixe os demais campos nulos.
+    Em 'lista_provas', NÃO inclua "Certidão de Nascimento" nem "Título de Eleitor/Certidão Eleitoral".
+    Em 'preliminares', use a Estratégia Processual e o HTML `<h3>I.1 – TÍTULO DA PRELIMINAR</h3><p>Texto...</p>`.
+
+    Campos a reescrever: {campos}
+    Apontamentos do Revisor: {findings}
+    Estratégia Processual: {strategy}"""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "Caso: {input}\nTipo: {doc_type}\nTexto atual dos campos (JSON): {fields}")
+    ])
 
-workflow.add_node("orchestrator", orchestrator_node)
-workflow.add_node("researcher", researcher_node)
-workflow.add_node("strategist", strategist_node) # <--- NOVO NÓ
-workflow.add_node("calculator", calculator_node)
-workflow.add_node("writer", writer_node)
-workflow.add_node("editor", editor_node)   # <--- NOVO NÓ
-workflow.add_node("reviewer", reviewer_node)
-
-workflow.set_entry_point("orchestrator")
-
-def decide_next(state):
-    return state["next"]
-
-workflow.add_conditional_edges(
-    "orchestrator",
-    decide_next,
-    {
-        "researcher": "researcher",
-        "strategist": "strategist",
-        "calculator": "calculator",
-        "writer": "writer",
-        "reviewer": "reviewer", # Nota: O Orchestrator manda pro Reviewer se score == 0...
-        "END": END
+    current = {campo: getattr(draft, campo) for campo in campos}
+    fixed = count_tokens(system_prompt) + count_tokens(state["doc_type"])
+    sections, counts = fit_sections([
+        ("fields", json.dumps(current, ensure_ascii=False), REVISER_SECTION_BUDGETS["fields"]),
+        ("findings", state.get("review_comments"), REVISER_SECTION_BUDGETS["findings"]),
+        ("input", state["input_text"], REVISER_SECTION_BUDGETS["input"]),
+        # a estratégia só é necessária para reescrever as preliminares
+        ("strategy", state.get("legal_strategy") if "preliminares" in campos else "", REVISER_SECTION_BUDGETS["strategy"]),
+    ], total_budget=max(REVISER_PROMPT_BUDGET - fixed, 0))
+    print(f"   📏 Prompt por seção: {counts} + fixo {fixed} = {sum(counts.values()) + fixed} tokens")
+
+    messages = prompt.format_messages(
+        campos=", ".join(campos),
+        findings=sections["findings"],
+        strategy=sections["strategy"],
+        input=sections["input"],
+        doc_type=state["doc_type"],
+        fields=sections["fields"]
+    )
+    output, usage = await call_llm("reviser", messages, schema=ReescritaOutput, bypass=state.get("bypass_cache", False))
+
+    # Só entram os campos apontados que o modelo de fato devolveu
+    changed = {campo: getattr(output, campo) for campo in campos if getattr(output, campo) is not None}
+    return {
+        "draft": draft.model_copy(update=changed),
+        "revised_fields": list(changed),
+        "revision_count": state.get("revision_count", 0) + 1,
+        "quality_score": 0,
+        "token_usage": {"reviser": usage}
     }
-)
-
-# FLUXO AJUSTADO:
-workflow.add_edge("researcher", "orchestrator")
-workflow.add_edge("strategist", "orchestrator")
-workflow.add_edge("calculator", "orchestrator")
 
-# AQUI ESTÁ A MUDANÇA PRINCIPAL NO FLUXO:
-# Writer -> Editor -> Reviewer -> Orchestrator
-# Quando o Writer termina, ele manda para o Editor.
-# Quando o Editor termina, ele manda para o Reviewer (para ver se a edição não quebrou nada jurídico).
-# O Reviewer manda para o Orchestrator (que decide se aprova ou manda reescrever).
+# --- 3. MONTAGEM DO GRAFO ---
 
-workflow.add_edge("writer", "editor")  # Writer passa para Editor
-workflow.add_edge("editor", "orchestrator") # Editor volta pro Orquestrador?
-# Melhor: Writer -> Editor -> Orchestrator (que vai ver score 0 e mandar pro Reviewer)
-# Mas o Orchestrator vai ver 'score=0' e mandar pro 'reviewer'. 
-# O problema é: O writer reseta o score para 0.
-# Se Writer -> Editor -> Orchestrator -> Reviewer, funciona.
+def _node(name: str, fn):
+    # Cada nó é medido (graph_node_duration_seconds em /metrics) e vira um span no trace
+    return timed_node(name, traced(f"node.{name}")(fn))
 
-workflow.add_edge("editor", "orchestrator") # Editor devolve pro Orquestrador
-workflow.add_edge("reviewer", "orchestrator")
+workflow = StateGraph(AgentState)
 
-app_graph = workflow.compile()
\ No newline at end of file
+workflow.add_node("researcher", _node("researcher", researcher_node))
+workflow.add_node("strategist", _node("strategist", strategist_node))
+workflow.add_node("calculator", _node("calculator", calculator_node))
+workflow.add_node("writer", _node("writer", writer_node))
+workflow.add_node("editor", _node("editor", editor_node))
+workflow.add_node("validator", _node("validator", validator_node))
+workflow.add_node("reviewer", _node("reviewer", reviewer_node))
+workflow.add_node("reviser", _node("reviser", reviser_node))
+
+# START -> preparação pendente em paralelo (ou direto ao Writer se já veio tudo pronto)
+workflow.add_conditional_edges(START, route_preparation, [*PREPARATION_NODES, "writer"])
+
+# Os ramos de preparação rodam no mesmo passo; o Writer só dispara depois de todos
+for node in PREPARATION_NODES:
+    workflow.add_edge(node, "writer")
+
+# Writer -> Editor -> Validator -> Reviewer -> (reescrita dos campos apontados ou fim)
+workflow.add_edge("writer", "editor")
+workflow.add_edge("editor", "validator")
+# Regras locais reprovaram: pula o Revisor (LLM) e vai direto à reescrita
+workflow.add_conditional_edges("validator", route_after_validation, ["reviewer", "reviser", END])
+workflow.add_conditional_edges("reviewer", route_after_review, ["reviser", END])
+# Reviser -> Editor (só o texto reescrito) -> Validator -> Reviewer; nada reescrito: fim
+workflow.add_conditional_edges("reviser", route_after_revision, ["editor", END])
+
+app_graph = workflow.compile()
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from fastapi import Header, Depends
+from supabase import AsyncClient
+
+from services.database import get_supabase
+from services.auth import authenticate, require_admin
+
+
+# --- DEPENDÊNCIAS DE SEGURANÇA (compartilhadas pelos endpoints) ---
+async def verify_token(authorization: Optional[str] = Header(None), supabase: AsyncClient = Depends(get_supabase)):
+    # JWT validado localmente (secret/JWKS) com cache de claims; ver services/auth.py
+    return await authenticate(authorization, supabase)
+
+
+async def verify_admin(authorization: Optional[str] = Header(None), supabase: AsyncClient = Depends(get_supabase)):
+    return await require_admin(authorization, supabase)
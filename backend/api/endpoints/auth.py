@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Header, Depends
+from pydantic import BaseModel
+from typing import Optional
+from api.deps import verify_token, verify_admin
+from services.auth import bearer_token, forget_token, revoke_token, invalidate_role
+
+router = APIRouter()
+
+
+class RoleInvalidation(BaseModel):
+    user_id: Optional[str] = None
+
+
+@router.post('/refresh')
+async def refresh_session(authorization: Optional[str] = Header(None), user=Depends(verify_token)):
+    """Descarta claims e papel cacheados do próprio usuário (ex.: após troca de role)."""
+    forget_token(bearer_token(authorization))
+    invalidate_role(user.id)
+    return { 'status': 'ok' }
+
+
+@router.post('/logout')
+async def logout(authorization: Optional[str] = Header(None), user=Depends(verify_token)):
+    """Revoga o token até o `exp` dele, mesmo com a assinatura ainda válida.
+
+    A revogação é local a este processo (outros workers continuam aceitando o
+    token) e não encerra a sessão no Supabase: o refresh token segue válido.
+    """
+    revoke_token(bearer_token(authorization))
+    invalidate_role(user.id)
+    return { 'status': 'ok' }
+
+
+@router.post('/roles/invalidate')
+async def invalidate_roles(data: RoleInvalidation, user=Depends(verify_admin)):
+    """Propaga mudanças de papel: invalida um usuário específico ou todo o cache."""
+    invalidate_role(data.user_id)
+    return { 'status': 'ok' }
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+from services.calculations import generate_payment_tables_batch, get_valor_extenso
+from services.executor import run_blocking
+
+router = APIRouter()
+
+MAX_BATCH_ITEMS = 10000
+
+
+class CalculationItem(BaseModel):
+    id: Optional[str] = Field(None, example="cliente-123")
+    birth_date: Optional[str] = Field(None, example="2024-03-15")
+
+
+class CalculationBatchQuery(BaseModel):
+    items: List[CalculationItem] = Field(..., max_length=MAX_BATCH_ITEMS)
+    months: int = Field(4, ge=1, le=120)
+    reference_date: Optional[date] = None
+    include_extenso: bool = False
+
+
+def _calculate_batch(birth_dates: list, months: int, reference_date: Optional[date], include_extenso: bool):
+    """Tabelas e (opcionalmente) valores por extenso, tudo no mesmo job do pool."""
+    tables = generate_payment_tables_batch(birth_dates, months=months, reference_date=reference_date)
+    extensos = [get_valor_extenso(total) for _, total in tables] if include_extenso else None
+    return tables, extensos
+
+
+@router.post("/batch")
+async def calculate_batch(data: CalculationBatchQuery):
+    """Tabela de pagamento e valor da causa de vários clientes em uma chamada"""
+    try:
+        # CPU puro (inclusive o num2words): roda no pool para não travar o event loop em lotes grandes
+        tables, extensos = await run_blocking(
+            _calculate_batch,
+            [i.birth_date for i in data.items],
+            data.months,
+            data.reference_date,
+            data.include_extenso
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = []
+    for n, (item, (tabela, valor_total)) in enumerate(zip(data.items, tables)):
+        result = {
+            'index': n,
+            'id': item.id,
+            'birth_date': item.birth_date,
+            'tabela_calculo': tabela,
+            'valor_total': valor_total,
+        }
+        if extensos is not None:
+            result['valor_causa_extenso'] = extensos[n]
+        results.append(result)
+
+    return {
+        'total': len(results),
+        'calculated': sum(1 for r in results if r['tabela_calculo']),
+        'valor_total': round(sum(r['valor_total'] for r in results), 2),
+        'results': results
+    }
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from api.deps import verify_admin
+from services.tracing import trace_buffer
+
+router = APIRouter()
+
+
+@router.get('/traces')
+async def list_traces(limit: int = Query(50, ge=1, le=500), request_id: Optional[str] = None, user=Depends(verify_admin)):
+    """Traces mais recentes (resumo: trace_id, request_id, rota, status, duração, nº de spans).
+    Com `request_id`, só os traces com esse X-Request-ID (o cliente pode repeti-lo).
+    """
+    traces = trace_buffer.by_request_id(request_id)[:limit] if request_id else trace_buffer.recent(limit)
+    return [t.summary() for t in traces]
+
+
+@router.get('/traces/{trace_id}')
+async def get_trace(trace_id: str, user=Depends(verify_admin)):
+    """Árvore de spans pelo trace_id; aceita também o X-Request-ID ou o id do job (trace mais recente com ele)."""
+    trace = trace_buffer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace não encontrado (expirou do buffer ou id inválido)")
+    return trace.to_dict()
@@ -1,53 +1,18 @@
 import os
-from fastapi import APIRouter, HTTPException, Header, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
 from typing import Optional, List
 from pydantic import BaseModel
-from supabase import create_client, Client
-import csv
-import io
+from supabase import AsyncClient
+from postgrest.types import ReturnMethod
+from services.database import get_supabase
+from api.deps import verify_admin
+from services.upload_reader import iter_upload_batches
+from services.search import jurisprudence_index, invalidate_jurisprudence
 
 router = APIRouter()
 
-# Inicializa o Supabase no Python
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-
-async def verify_admin(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Token de autenticação ausente.")
-    try:
-        token = authorization.split(" ")[1]
-        user_res = supabase.auth.get_user(token)
-        # extract user id robustly
-        user_id = None
-        try:
-            user_id = getattr(user_res, 'data', None) and getattr(user_res.data, 'user', None) and user_res.data.user.id
-        except Exception:
-            try:
-                user_id = (user_res or {}).get('data', {}).get('user', {}).get('id')
-            except Exception:
-                user_id = None
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Sessão inválida ou expirada.")
-        # check profile role
-        prof = supabase.table('profiles').select('role').eq('id', user_id).single().execute()
-        role = None
-        try:
-            role = getattr(prof, 'data', None) and getattr(prof.data, 'role', None)
-        except Exception:
-            try:
-                role = (prof or {}).get('data', {}).get('role')
-            except Exception:
-                role = None
-        if role != 'admin':
-            raise HTTPException(status_code=403, detail='Admin role required')
-        return user_id
-    except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(status_code=401, detail="Acesso negado.")
+IMPORT_BATCH_SIZE = int(os.getenv('JURIS_IMPORT_BATCH_SIZE', '500'))
+MAX_IMPORT_BATCH_SIZE = 5000
 
 
 class JurisModel(BaseModel):
@@ -75,34 +40,44 @@ def extract_error(resp):
 
 
 @router.post('/')
-async def create_juris(j: JurisModel, user=Depends(verify_admin)):
+async def create_juris(j: JurisModel, user=Depends(verify_admin), supabase: AsyncClient = Depends(get_supabase)):
     try:
         payload = j.dict()
-        res = supabase.table('jurisprudences').insert([payload]).execute()
+        res = await supabase.table('jurisprudences').insert([payload]).execute()
         err = extract_error(res)
         if err:
             raise Exception(err)
+        invalidate_jurisprudence()
         return { 'status': 'ok' }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get('/')
-async def list_juris(q: Optional[str] = None, tags: Optional[str] = None, court: Optional[str] = None, limit: int = 20):
+async def list_juris(q: Optional[str] = None, tags: Optional[str] = None, court: Optional[str] = None, limit: int = 20, supabase: AsyncClient = Depends(get_supabase)):
     try:
-        query = supabase.table('jurisprudences').select('*')
+        # tags comma separated
+        tag_list = [t.strip() for t in tags.split(',') if t.strip()] if tags else []
         if q:
-            # simple ilike on title and summary
-            query = query.ilike('title', f'%{q}%')
-        if tags:
-            # tags comma separated
-            tag_list = [t.strip() for t in tags.split(',') if t.strip()]
-            if tag_list:
-                query = query.contains('tags', tag_list)
+            # busca ranqueada no índice BM25; depois carrega as linhas completas na mesma ordem
+            await jurisprudence_index.ensure_fresh()
+            ids = [doc['id'] for _, doc in jurisprudence_index.search(q, k=limit, court=court, tags=tag_list)]
+            if not ids:
+                return []
+            res = await supabase.table('jurisprudences').select('*').in_('id', ids).execute()
+            err = extract_error(res)
+            if err:
+                raise Exception(err)
+            by_id = {row['id']: row for row in (getattr(res, 'data', None) or [])}
+            return [by_id[i] for i in ids if i in by_id]
+
+        query = supabase.table('jurisprudences').select('*')
+        if tag_list:
+            query = query.contains('tags', tag_list)
         if court:
             query = query.eq('court', court)
         query = query.limit(limit)
-        res = query.execute()
+        res = await query.execute()
         err = extract_error(res)
         if err:
             raise Exception(err)
@@ -118,9 +93,9 @@ async def list_juris(q: Optional[str] = None, tags: Optional[str] = None, court:
 
 
 @router.get('/{id}')
-async def get_juris(id: str):
+async def get_juris(id: str, supabase: AsyncClient = Depends(get_supabase)):
     try:
-        res = supabase.table('jurisprudences').select('*').eq('id', id).single().execute()
+        res = await supabase.table('jurisprudences').select('*').eq('id', id).single().execute()
         err = extract_error(res)
         if err:
             raise Exception(err)
@@ -133,55 +108,86 @@ async def get_juris(id: str):
 
 
 @router.patch('/{id}')
-async def update_juris(id: str, j: JurisModel, user=Depends(verify_admin)):
+async def update_juris(id: str, j: JurisModel, user=Depends(verify_admin), supabase: AsyncClient = Depends(get_supabase)):
     try:
-        res = supabase.table('jurisprudences').update(j.dict()).eq('id', id).execute()
+        res = await supabase.table('jurisprudences').update(j.dict()).eq('id', id).execute()
         err = extract_error(res)
         if err:
             raise Exception(err)
+        invalidate_jurisprudence()
         return { 'status': 'ok' }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete('/{id}')
-async def delete_juris(id: str, user=Depends(verify_admin)):
+async def delete_juris(id: str, user=Depends(verify_admin), supabase: AsyncClient = Depends(get_supabase)):
     try:
-        res = supabase.table('jurisprudences').delete().eq('id', id).execute()
+        res = await supabase.table('jurisprudences').delete().eq('id', id).execute()
         err = extract_error(res)
         if err:
             raise Exception(err)
+        invalidate_jurisprudence()
         return { 'status': 'ok' }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def juris_payload(row: dict) -> dict:
+    return {
+        'title': row.get('title') or row.get('Title'),
+        'citation': row.get('citation'),
+        'court': row.get('court'),
+        'date': row.get('date'),
+        'summary': row.get('summary'),
+        'full_text': row.get('full_text') or row.get('fullText'),
+        'tags': [t.strip() for t in (row.get('tags') or '').split(';') if t.strip()],
+        'source_url': row.get('source_url')
+    }
+
+
 @router.post('/import')
-async def import_csv(file: UploadFile = File(...), user=Depends(verify_admin)):
+async def import_csv(file: UploadFile = File(...), batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE), user=Depends(verify_admin), supabase: AsyncClient = Depends(get_supabase)):
+    """Importa o CSV em lotes multi-linha de `batch_size` linhas.
+    Números de linha seguem a planilha: cabeçalho é a linha 1, primeiro registro a linha 2.
+    """
     try:
-        content = await file.read()
-        s = content.decode('utf-8')
-        reader = csv.DictReader(io.StringIO(s))
         inserted = 0
-        for row in reader:
-            payload = {
-                'title': row.get('title') or row.get('Title'),
-                'citation': row.get('citation'),
-                'court': row.get('court'),
-                'date': row.get('date'),
-                'summary': row.get('summary'),
-                'full_text': row.get('full_text') or row.get('fullText'),
-                'tags': [t.strip() for t in (row.get('tags') or '').split(';') if t.strip()],
-                'source_url': row.get('source_url')
-            }
-            # naive insert
-            res = supabase.table('jurisprudences').insert([payload]).execute()
-            err = extract_error(res)
-            if err:
-                # skip problematic row
-                print('Import row error:', err)
+        failed_chunks = []
+        skipped_rows = []
+        # lotes lidos incrementalmente do arquivo temporário do upload
+        async for chunk in iter_upload_batches(file.file, batch_size):
+            first_line = chunk[0][0]
+            payloads = []
+            for line, row in chunk:
+                payload = juris_payload(row)
+                if not payload['title']:
+                    # sem título o insert do lote inteiro falharia (NOT NULL)
+                    skipped_rows.append(line)
+                    continue
+                payloads.append(payload)
+            if not payloads:
                 continue
-            inserted += 1
-        return { 'status': 'ok', 'inserted': inserted }
+            try:
+                res = await supabase.table('jurisprudences').insert(payloads, returning=ReturnMethod.minimal).execute()
+                err = extract_error(res)
+                if err:
+                    raise Exception(err)
+                inserted += len(payloads)
+            except Exception as e:
+                failed_chunks.append({
+                    'rows': [first_line, chunk[-1][0]],
+                    'count': len(payloads),
+                    'error': str(e)
+                })
+        if inserted:
+            invalidate_jurisprudence()
+        return {
+            'status': 'ok',
+            'inserted': inserted,
+            'failed': sum(c['count'] for c in failed_chunks),
+            'failed_chunks': failed_chunks,
+            'skipped_rows': skipped_rows
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,13 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel, Field
-from typing import List, Dict
-from services.search import search_jurisprudence, search_jurisdiction_db
+from typing import List, Dict, Optional
+from api.deps import verify_admin
+from services.search import search_jurisprudence, search_jurisdiction_db, search_judicial_subsections_batch, cache_stats
 
 router = APIRouter()
 
+MAX_BATCH_ITEMS = 5000
+
 
 class SearchQuery(BaseModel):
     query: str
@@ -15,6 +18,16 @@ class JurisdictionQuery(BaseModel):
     state: str = Field(..., example="SP")
 
 
+class JurisdictionBatchItem(BaseModel):
+    address: Optional[str] = Field(None, example="Rua das Flores, 10 - Abaetetuba/PA")
+    municipality: Optional[str] = Field(None, example="Abaetetuba")
+    state: Optional[str] = Field(None, example="PA")
+
+
+class JurisdictionBatchQuery(BaseModel):
+    items: List[JurisdictionBatchItem] = Field(..., max_length=MAX_BATCH_ITEMS)
+
+
 @router.post("/jurisprudence")
 async def search_laws(data: SearchQuery):
     return await search_jurisprudence(data.query)
@@ -24,4 +37,27 @@ async def search_laws(data: SearchQuery):
 
 @router.post("/jurisdiction")
 async def search_jurisdiction(data: JurisdictionQuery):
-    return await search_jurisdiction_db(data.municipality, data.state)
\ No newline at end of file
+    return await search_jurisdiction_db(data.municipality, data.state)
+
+
+@router.post("/jurisdiction/batch")
+async def search_jurisdiction_batch(data: JurisdictionBatchQuery):
+    """Resolve a competência de vários endereços ou pares (município, UF) em uma chamada"""
+    items = [
+        { 'address': i.address, 'city': i.municipality, 'state': i.state }
+        for i in data.items
+    ]
+    results = await search_judicial_subsections_batch(items)
+    found = sum(1 for r in results if r.get('found'))
+    return {
+        'total': len(results),
+        'found': found,
+        'not_found': len(results) - found,
+        'results': [ { 'index': n, **r } for n, r in enumerate(results) ]
+    }
+
+
+@router.get("/cache/stats")
+async def search_cache_stats(user=Depends(verify_admin)):
+    """Contadores de hit/miss/evicção dos caches de busca"""
+    return cache_stats()
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from api.endpoints import agents, search, clients, jurisprudence, jurisdiction #, health
+from api.endpoints import agents, auth, search, clients, jurisprudence, jurisdiction, calculations, debug #, health
 
 api_router = APIRouter()
 
@@ -9,4 +9,7 @@ api_router.include_router(search.router, prefix="/search", tags=["Search"])
 api_router.include_router(clients.router, prefix="/clients", tags=["Clients"])
 api_router.include_router(jurisprudence.router, prefix="/jurisprudence", tags=["Jurisprudence"])
 api_router.include_router(jurisdiction.router, prefix="/jurisdiction", tags=["Jurisdiction"])
+api_router.include_router(auth.router, prefix="/auth", tags=["Auth"])
+api_router.include_router(calculations.router, prefix="/calculations", tags=["Calculations"])
+api_router.include_router(debug.router, prefix="/debug", tags=["Debug"])
 #api_router.include_router(health.router, tags=["Health"])
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Compara o cálculo em lote (NumPy) com o caminho escalar de generate_payment_table.
+
+Gera N datas de nascimento aleatórias, confere que as duas versões produzem
+exatamente as mesmas tabelas e totais e mede o tempo de cada uma. O caminho
+escalar roda com o memo limpo, como na primeira requisição de cada cliente.
+
+Uso (a partir de backend/):  python -m benchmarks.bench_calculations
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import date
+
+from services import calculations
+from services.calculations import generate_payment_table, generate_payment_tables_batch
+
+CLIENTS = int(os.getenv('BENCH_CLIENTS', '5000'))
+MONTHS = int(os.getenv('BENCH_MONTHS', '4'))
+SEED = int(os.getenv('BENCH_SEED', '42'))
+
+
+def random_dates(n: int) -> list:
+    rng = random.Random(SEED)
+    start = date(1994, 7, 1).toordinal()
+    end = date.today().toordinal()
+    return [date.fromordinal(rng.randint(start, end)).isoformat() for _ in range(n)]
+
+
+def main() -> dict:
+    dates = random_dates(CLIENTS)
+
+    calculations._payment_table.cache_clear()
+    started = time.perf_counter()
+    scalar = [generate_payment_table(d, MONTHS) for d in dates]
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = generate_payment_tables_batch(dates, MONTHS)
+    batch_s = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(scalar, batch) if a != b)
+    return {
+        'clients': CLIENTS,
+        'months': MONTHS,
+        'scalar_s': round(scalar_s, 4),
+        'batch_s': round(batch_s, 4),
+        'speedup': round(scalar_s / batch_s, 1) if batch_s else None,
+        'mismatches': mismatches,
+        'ok': mismatches == 0,
+    }
+
+
+if __name__ == '__main__':
+    result = main()
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['ok'] else 1)
@@ -0,0 +1,72 @@
+"""Verifica que consultas lentas ao Supabase não serializam o event loop.
+
+Sobe o cliente compartilhado de services/database.py sobre um transporte
+httpx simulado que responde após LATENCY segundos e dispara N consultas em
+paralelo. A consulta é a leitura de `ai_agents` que toda geração faz: as buscas
+de jurisprudência usam o índice em memória (uma carga compartilhada) e não
+provariam nada sobre consultas simultâneas. Com o caminho assíncrono o tempo total fica perto de max(latência),
+não da soma.
+
+Uso (a partir de backend/):  python -m benchmarks.bench_concurrency
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+from supabase import AsyncClientOptions, acreate_client
+
+from services import database
+
+LATENCY = float(os.getenv('BENCH_LATENCY', '0.2'))
+PARALLEL = int(os.getenv('BENCH_PARALLEL', '20'))
+
+requests = []
+
+
+async def slow_postgrest(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(LATENCY)
+    requests.append(request.url.path)
+    return httpx.Response(200, json=[], headers={'content-range': '0-0/0'})
+
+
+async def install_fake_client():
+    http = httpx.AsyncClient(transport=httpx.MockTransport(slow_postgrest))
+    options = AsyncClientOptions(httpx_client=http, auto_refresh_token=False, persist_session=False)
+    database._http = http
+    database._client = await acreate_client('https://bench.supabase.co', 'bench-key', options=options)
+
+
+async def agent_instruction(slug: str):
+    # mesma consulta de prepare_generation (services/generation.py): um GET ao PostgREST por chamada
+    supabase = await database.get_supabase()
+    return await supabase.table('ai_agents').select('system_instruction').eq('slug', slug).execute()
+
+
+async def main() -> dict:
+    await install_fake_client()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*[agent_instruction(f"agente-{i}") for i in range(PARALLEL)])
+        elapsed = time.perf_counter() - started
+    finally:
+        await database.close_supabase()
+
+    result = {
+        'parallel': PARALLEL,
+        'postgrest_requests': len(requests),
+        'latency_s': LATENCY,
+        'elapsed_s': round(elapsed, 4),
+        'serial_estimate_s': round(PARALLEL * LATENCY, 4),
+        # aceita até 3x a latência de uma chamada como "concorrente"
+        'concurrent': len(requests) == PARALLEL and elapsed < LATENCY * 3,
+    }
+    return result
+
+
+if __name__ == '__main__':
+    result = asyncio.run(main())
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['concurrent'] else 1)
@@ -0,0 +1,86 @@
+"""Carga no grafo de agentes: vazão de gerações com LLM simulado.
+
+Troca o ChatOpenAI pelo dublê de benchmarks/fakes.py, que responde a
+/chat/completions após LLM_LATENCY segundos (sem OpenAI de verdade), e roda
+app_graph.ainvoke com N gerações simultâneas para cada nível de concorrência.
+Com os nós assíncronos a vazão cresce quase linearmente com a concorrência.
+
+Uso (a partir de backend/):  python -m benchmarks.bench_generate_load
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+from agents import workflow
+from benchmarks.fakes import fake_chat_model
+from services.llm_cache import llm_cache
+
+LLM_LATENCY = float(os.getenv('BENCH_LLM_LATENCY', '0.2'))
+LEVELS = [int(n) for n in os.getenv('BENCH_CONCURRENCY', '1,4,16').split(',')]
+REQUESTS_PER_LEVEL = int(os.getenv('BENCH_REQUESTS', '16'))
+
+
+def initial_state(n: int) -> dict:
+    return {
+        "input_text": f"Cliente {n}: trabalhadora rural, pedido de salário-maternidade.",
+        "doc_type": "Salário-Maternidade Rural",
+        "client_data": {"details": "rural", "child_birth_date": "2024-01-10"},
+        "research_results": "- TRF1: início de prova material contemporâneo basta.",
+        "calc_results": "Valor Total da Causa: R$ 6000.0.",
+        "system_instruction": None,
+        "revision_count": 0,
+        "quality_score": 0,
+        "review_comments": "",
+        "bypass_cache": True,
+    }
+
+
+async def run_level(concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n):
+        async with sem:
+            t = time.perf_counter()
+            await workflow.app_graph.ainvoke(initial_state(n))
+            latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(n) for n in range(REQUESTS_PER_LEVEL)])
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'requests': REQUESTS_PER_LEVEL,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(REQUESTS_PER_LEVEL / elapsed, 2),
+        'mean_latency_s': round(sum(latencies) / len(latencies), 3),
+    }
+
+
+async def main() -> dict:
+    workflow.llm = fake_chat_model(LLM_LATENCY)
+    llm_cache.enabled = False
+    try:
+        levels = [await run_level(c) for c in LEVELS]
+    finally:
+        await workflow.llm.http_async_client.aclose()
+
+    base, top = levels[0], levels[-1]
+    scaling = top['throughput_rps'] / base['throughput_rps'] if base['throughput_rps'] else 0
+    ideal = min(top['concurrency'], REQUESTS_PER_LEVEL) / base['concurrency']
+    return {
+        'llm_latency_s': LLM_LATENCY,
+        'levels': levels,
+        'scaling': round(scaling, 2),
+        'ideal_scaling': ideal,
+        # aceita metade do ganho ideal como "escala com a concorrência"
+        'scales': scaling >= ideal / 2,
+    }
+
+
+if __name__ == '__main__':
+    result = asyncio.run(main())
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['scales'] else 1)
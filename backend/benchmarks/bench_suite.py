@@ -0,0 +1,440 @@
+"""Suíte de benchmarks offline: vazão e latências p50/p95/p99 dos caminhos principais.
+
+Roda a aplicação FastAPI em processo (httpx.ASGITransport) sobre os dublês de
+benchmarks/fakes.py: LLM determinístico com latência BENCH_LLM_LATENCY e um
+PostgREST em memória (latência BENCH_DB_LATENCY) populado com
+data/jurisdiction_para.csv e jurisprudências sintéticas. Nada sai da máquina.
+
+Cenários:
+- generate:              POST /api/agents/generate
+- generate_stream:       POST /api/agents/generate/stream; além da duração total,
+                         ttfb_* = tempo até o primeiro evento `token` do Writer
+- jurisprudence_import:  POST /api/jurisprudence/import (CSV sintético)
+- jurisdiction_import:   POST /api/jurisdiction/import (data/jurisdiction_para.csv)
+- resolver_single:       search_judicial_subsection, um município por chamada
+- resolver_batch:        POST /api/search/jurisdiction/batch com todos os municípios do CSV
+- calculations_scalar:   generate_payment_table, uma data por chamada (memo limpo)
+- calculations_batch:    POST /api/calculations/batch
+
+O resultado (JSON) vai para BENCH_OUTPUT (padrão benchmarks/results/<data>.json).
+Com BENCH_BASELINE apontando para um resultado anterior, compara p95 e vazão de
+cada cenário e sai com código 1 se algum piorar mais que BENCH_REGRESSION_PCT %.
+
+Uso (a partir de backend/):  python -m benchmarks.bench_suite
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+
+from benchmarks import fakes
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', '32'))
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '8'))
+LLM_LATENCY = float(os.getenv('BENCH_LLM_LATENCY', '0.05'))
+DB_LATENCY = float(os.getenv('BENCH_DB_LATENCY', '0.002'))
+JURISPRUDENCES = int(os.getenv('BENCH_JURISPRUDENCES', '2000'))
+IMPORT_RUNS = int(os.getenv('BENCH_IMPORT_RUNS', '5'))
+IMPORT_ROWS = int(os.getenv('BENCH_IMPORT_ROWS', '500'))
+CALC_BATCH = int(os.getenv('BENCH_CALC_BATCH', '1000'))
+SEED = int(os.getenv('BENCH_SEED', '42'))
+SCENARIOS = [s for s in os.getenv('BENCH_SCENARIOS', '').split(',') if s]
+OUTPUT = os.getenv('BENCH_OUTPUT', '')
+BASELINE = os.getenv('BENCH_BASELINE', '')
+REGRESSION_PCT = float(os.getenv('BENCH_REGRESSION_PCT', '20'))
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+# --- Medição ---
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Percentil pelo método nearest-rank (valores já ordenados)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float, items: int) -> dict:
+    """Estatísticas de um cenário; `latencies` inclui as operações que falharam."""
+    ms = sorted(v * 1000 for v in latencies)
+    ops = len(latencies)
+    return {
+        'ops': ops,
+        'errors': errors,
+        'items': items,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_ops': round(ops / elapsed, 2) if elapsed else None,
+        'throughput_items': round(items / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'mean_ms': round(sum(ms) / len(ms), 3) if ms else 0.0,
+        'max_ms': round(ms[-1], 3) if ms else 0.0,
+    }
+
+
+async def measure(op, n: int, concurrency: int, items_per_op: int = 1) -> dict:
+    """Executa `op(i)` n vezes com até `concurrency` em paralelo.
+
+    `op` devolve True/None em caso de sucesso e False (ou exceção) em caso de erro.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    latencies, error_latencies, messages = [], [], []
+
+    async def one(i):
+        async with sem:
+            t = time.perf_counter()
+            try:
+                ok = await op(i)
+            except Exception as e:
+                ok = False
+                messages.append(f'{type(e).__name__}: {e}')
+            elapsed = time.perf_counter() - t
+            latencies.append(elapsed)
+            if ok is False:
+                error_latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(n)])
+    elapsed = time.perf_counter() - started
+    errors = len(error_latencies)
+    result = summarize(latencies, errors, elapsed, (len(latencies) - errors) * items_per_op)
+    if errors:
+        # falhas rápidas (ou timeouts) distorcem os percentis: ficam visíveis à parte
+        result['error_mean_ms'] = round(sum(error_latencies) * 1000 / errors, 3)
+        if messages:
+            result['first_error'] = messages[0]
+    return result
+
+
+def expect(response: httpx.Response, status: int = 200) -> bool:
+    if response.status_code != status:
+        raise RuntimeError(f'HTTP {response.status_code}: {response.text[:200]}')
+    return True
+
+
+# --- Cenários ---
+
+def birth_dates(n: int) -> list:
+    rng = random.Random(SEED)
+    start = date(1994, 7, 1).toordinal()
+    end = date.today().toordinal()
+    return [date.fromordinal(rng.randint(start, end)).isoformat() for _ in range(n)]
+
+
+def generate_payload(i: int, place: dict, birth: str) -> dict:
+    return {
+        'agentName': 'Salário-Maternidade',
+        'agentSlug': 'salario-maternidade',
+        'docType': 'Salário-Maternidade Rural',
+        'clientName': f'Cliente {i}',
+        'details': f'Cliente {i}: trabalhadora rural em economia familiar, pedido de salário-maternidade.',
+        'clientData': {
+            'name': f'Cliente {i}',
+            'address': f"Travessa {i}, s/n - {place['municipality']}/{place['state']}",
+            'city': place['municipality'],
+            'state': place['state'],
+            'details': 'Trabalha na roça com os pais desde os 12 anos.',
+            'child_birth_date': birth,
+        },
+        # cada geração percorre o grafo inteiro (sem respostas do cache do LLM)
+        'bypassCache': True,
+    }
+
+
+async def scenario_generate(client: httpx.AsyncClient, places: list) -> dict:
+    dates = birth_dates(REQUESTS)
+
+    async def op(i):
+        payload = generate_payload(i, places[i % len(places)], dates[i])
+        return expect(await client.post('/api/agents/generate', json=payload))
+    return await measure(op, REQUESTS, CONCURRENCY)
+
+
+async def post_sse(path: str, payload: dict, on_event):
+    """POST direto na aplicação ASGI, chamando `on_event(nome)` a cada evento SSE recebido.
+
+    O httpx.ASGITransport só devolve a resposta quando o corpo termina; aqui os
+    chunks são vistos à medida que o StreamingResponse os envia.
+    """
+    from main import app
+    body = json.dumps(payload).encode('utf-8')
+    done = asyncio.Event()
+    sent_body = False
+    status, buffer = None, ''
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, buffer
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            buffer += message.get('body', b'').decode('utf-8')
+            while '\n\n' in buffer:
+                block, buffer = buffer.split('\n\n', 1)
+                name = next((line[7:] for line in block.split('\n') if line.startswith('event: ')), None)
+                if name:
+                    on_event(name, block)
+            if not message.get('more_body', False):
+                done.set()
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'bench'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 0), 'server': ('bench', 80),
+    }
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return status
+
+
+async def scenario_generate_stream(client: httpx.AsyncClient, places: list) -> dict:
+    dates = birth_dates(REQUESTS)
+    first_token = []
+
+    async def op(i):
+        payload = generate_payload(i, places[i % len(places)], dates[i])
+        started = time.perf_counter()
+        seen = {}
+
+        def on_event(name, block):
+            if name == 'token' and 'token' not in seen:
+                first_token.append(time.perf_counter() - started)
+            seen.setdefault(name, block)
+
+        status = await post_sse('/api/agents/generate/stream', payload, on_event)
+        if status != 200 or 'error' in seen or 'result' not in seen:
+            raise RuntimeError(f"HTTP {status}: {seen.get('error', 'sem evento result')[:200]}")
+        if 'token' not in seen:
+            raise RuntimeError('nenhum evento token antes do resultado')
+        return True
+
+    result = await measure(op, REQUESTS, CONCURRENCY)
+    ttfb = sorted(v * 1000 for v in first_token)
+    for p in (50, 95, 99):
+        result[f'ttfb_p{p}_ms'] = round(percentile(ttfb, p), 3)
+    return result
+
+
+async def scenario_jurisprudence_import(client: httpx.AsyncClient, places: list) -> dict:
+    files = [fakes.jurisprudence_csv(IMPORT_ROWS, seed=SEED + run) for run in range(IMPORT_RUNS)]
+
+    async def op(i):
+        res = await client.post('/api/jurisprudence/import',
+                                files={'file': ('jurisprudencias.csv', files[i], 'text/csv')})
+        return expect(res) and res.json().get('inserted') == IMPORT_ROWS
+    # imports concorrentes não são o caso real (um admin por vez): mede em série
+    return await measure(op, IMPORT_RUNS, 1, items_per_op=IMPORT_ROWS)
+
+
+async def scenario_jurisdiction_import(client: httpx.AsyncClient, places: list) -> dict:
+    with open(fakes.JURISDICTION_CSV, 'rb') as f:
+        content = f.read()
+
+    async def op(i):
+        res = await client.post('/api/jurisdiction/import',
+                                files={'file': ('jurisdiction_para.csv', content, 'text/csv')})
+        return expect(res)
+    # banco já populado com o mesmo CSV: mede a reimportação (caso comum de atualização)
+    return await measure(op, IMPORT_RUNS, 1, items_per_op=len(places))
+
+
+async def scenario_resolver_single(client: httpx.AsyncClient, places: list) -> dict:
+    from services.search import search_judicial_subsection, jurisdiction_cache
+
+    jurisdiction_cache.invalidate()
+
+    async def op(i):
+        place = places[i]
+        res = await search_judicial_subsection(
+            f"Rua {i}, 10 - {place['municipality']}/{place['state']}", city=place['municipality'], state=place['state']
+        )
+        return bool(res.get('found'))
+    return await measure(op, len(places), CONCURRENCY)
+
+
+async def scenario_resolver_batch(client: httpx.AsyncClient, places: list) -> dict:
+    from services.search import jurisdiction_cache
+
+    items = [{'municipality': p['municipality'], 'state': p['state']} for p in places]
+
+    async def op(i):
+        jurisdiction_cache.invalidate()
+        res = await client.post('/api/search/jurisdiction/batch', json={'items': items})
+        return expect(res) and res.json()['not_found'] == 0
+    return await measure(op, REQUESTS, CONCURRENCY, items_per_op=len(items))
+
+
+async def scenario_calculations_scalar(client: httpx.AsyncClient, places: list) -> dict:
+    from services import calculations
+
+    dates = birth_dates(CALC_BATCH)
+    calculations._payment_table.cache_clear()
+
+    async def op(i):
+        calculations.generate_payment_table(dates[i])
+    return await measure(op, len(dates), 1)
+
+
+async def scenario_calculations_batch(client: httpx.AsyncClient, places: list) -> dict:
+    items = [{'id': str(n), 'birth_date': d} for n, d in enumerate(birth_dates(CALC_BATCH))]
+
+    async def op(i):
+        res = await client.post('/api/calculations/batch', json={'items': items, 'include_extenso': True})
+        return expect(res) and res.json()['total'] == len(items)
+    return await measure(op, REQUESTS, CONCURRENCY, items_per_op=len(items))
+
+
+ALL_SCENARIOS = {
+    'calculations_scalar': scenario_calculations_scalar,
+    'calculations_batch': scenario_calculations_batch,
+    'resolver_single': scenario_resolver_single,
+    'resolver_batch': scenario_resolver_batch,
+    'generate': scenario_generate,
+    'generate_stream': scenario_generate_stream,
+    'jurisprudence_import': scenario_jurisprudence_import,
+    'jurisdiction_import': scenario_jurisdiction_import,
+}
+
+
+# --- Comparação com a linha de base ---
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list:
+    """Cenários cujo p95 subiu ou cuja vazão caiu mais que `threshold_pct` %."""
+    regressions = []
+    limit = threshold_pct / 100
+    for name, now in current['scenarios'].items():
+        before = (baseline.get('scenarios') or {}).get(name)
+        if not before:
+            continue
+        if before.get('p95_ms') and now['p95_ms'] > before['p95_ms'] * (1 + limit):
+            regressions.append({'scenario': name, 'metric': 'p95_ms', 'baseline': before['p95_ms'], 'current': now['p95_ms']})
+        if before.get('throughput_ops') and (now['throughput_ops'] or 0) < before['throughput_ops'] * (1 - limit):
+            regressions.append({'scenario': name, 'metric': 'throughput_ops',
+                                'baseline': before['throughput_ops'], 'current': now['throughput_ops']})
+        if now['errors'] > before.get('errors', 0):
+            regressions.append({'scenario': name, 'metric': 'errors', 'baseline': before.get('errors', 0), 'current': now['errors']})
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# --- Execução ---
+
+async def main() -> dict:
+    import main as app_module
+    from agents import workflow
+    from api.deps import verify_token, verify_admin
+    from services.llm_cache import llm_cache
+
+    places = [{'municipality': r['municipality'], 'state': r['state']} for r in fakes.read_jurisdiction_csv()]
+    db = fakes.FakePostgREST()
+    fakes.seed_jurisdiction(db)
+    db.insert_rows('jurisprudences', fakes.synthetic_jurisprudences(JURISPRUDENCES, seed=SEED))
+    db.insert_rows('ai_agents', [{'slug': 'salario-maternidade', 'system_instruction': None}])
+    await db.install()
+    db.latency = DB_LATENCY
+
+    workflow.llm = fakes.fake_chat_model(LLM_LATENCY)
+    llm_cache.enabled = False
+    user = SimpleNamespace(id='bench', email='bench@example.com')
+    overrides = app_module.app.dependency_overrides
+    for dependency in (verify_token, verify_admin):
+        overrides[dependency] = lambda: user
+
+    selected = SCENARIOS or list(ALL_SCENARIOS)
+    unknown = [s for s in selected if s not in ALL_SCENARIOS]
+    if unknown:
+        raise SystemExit(f'Cenários desconhecidos: {", ".join(unknown)}')
+
+    scenarios = {}
+    transport = httpx.ASGITransport(app=app_module.app)
+    try:
+        # índices em memória carregados antes: a primeira operação não paga a carga
+        from services.search import jurisdiction_index, jurisprudence_index
+        await asyncio.gather(jurisdiction_index.ensure_fresh(), jurisprudence_index.ensure_fresh())
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            for name in selected:
+                print(f'⏱️ [Bench] {name}...', file=sys.stderr)
+                scenarios[name] = await ALL_SCENARIOS[name](client, places)
+    finally:
+        overrides.clear()
+        await workflow.llm.http_async_client.aclose()
+        from services.database import close_supabase
+        await close_supabase()
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'requests': REQUESTS,
+            'concurrency': CONCURRENCY,
+            'llm_latency_s': LLM_LATENCY,
+            'db_latency_s': DB_LATENCY,
+            'jurisprudences': JURISPRUDENCES,
+            'import_runs': IMPORT_RUNS,
+            'import_rows': IMPORT_ROWS,
+            'calc_batch': CALC_BATCH,
+            'seed': SEED,
+        },
+        'db_requests': db.requests,
+        'scenarios': scenarios,
+    }
+
+
+if __name__ == '__main__':
+    # os prints de progresso da aplicação iriam misturados ao JSON
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        result = asyncio.run(main())
+    finally:
+        sys.stdout = stdout
+
+    regressions = []
+    if BASELINE:
+        with open(BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, REGRESSION_PCT)
+        result['baseline'] = {'path': BASELINE, 'commit': baseline.get('commit'),
+                              'threshold_pct': REGRESSION_PCT, 'regressions': regressions}
+
+    output = OUTPUT or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f'📄 Resultado salvo em {output}', file=sys.stderr)
+    errors = sum(s['errors'] for s in result['scenarios'].values())
+    sys.exit(1 if regressions or errors else 0)
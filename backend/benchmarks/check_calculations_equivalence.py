@@ -0,0 +1,140 @@
+"""Confere que os cálculos compilados (bisect/produtos acumulados e lote NumPy)
+produzem exatamente o mesmo resultado da implementação original, que percorria
+SALARY_HISTORY campo a campo.
+
+Percorre todos os meses de 1994 até hoje (dias 1, 15 e 28-31 quando existem) com
+1, 4 e 12 competências, além de datas anteriores a 1994, vazias e inválidas.
+Sai com código 1 se qualquer valor divergir.
+
+Uso (a partir de backend/):  python -m benchmarks.check_calculations_equivalence
+"""
+import json
+import sys
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+
+from services import calculations
+from services.calculations import (
+    SALARY_HISTORY, parse_date, get_salary_for_date, calculate_adjusted_value,
+    generate_payment_table, generate_payment_tables_batch,
+)
+
+MONTHS = (1, 4, 12)
+DAYS = (1, 15, 28, 29, 30, 31)
+EXTRA_DATES = ['1990-05-10', '1993-12-31', '', None, 'data inválida', '31/02/2020', '2024-02-30']
+
+
+# --- Implementação original (antes da compilação do histórico) ---
+
+def legacy_get_salary_for_date(target_date):
+    target = parse_date(target_date)
+
+    for salary in SALARY_HISTORY:
+        vigencia = datetime.strptime(salary["vigencia"], "%Y-%m-%d").date()
+        if target >= vigencia:
+            return salary["valor"]
+
+    return SALARY_HISTORY[-1]["valor"]
+
+
+def legacy_calculate_adjusted_value(base_value, base_date):
+    base_dt = parse_date(base_date)
+    today = datetime.now().date()
+
+    adjusted_value = float(base_value)
+
+    for salary in SALARY_HISTORY:
+        vigencia = datetime.strptime(salary["vigencia"], "%Y-%m-%d").date()
+
+        # Lógica original: Se vigência > data_base e vigência <= hoje
+        if vigencia > base_dt and vigencia <= today:
+            adjusted_value = adjusted_value * (1 + salary["reajuste"] / 100)
+
+    return round(adjusted_value, 2)
+
+
+def legacy_generate_payment_table(birth_date_str: str, months=4):
+    if not birth_date_str:
+        return [], 0.0
+
+    birth_date = parse_date(birth_date_str)
+    table = []
+    total_reajustado = 0.0
+
+    month_names = [
+        'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+        'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+    ]
+
+    for i in range(months):
+        # Soma meses à data
+        competencia_date = birth_date + relativedelta(months=+i)
+
+        valor_base = legacy_get_salary_for_date(competencia_date)
+        valor_reajustado = legacy_calculate_adjusted_value(valor_base, competencia_date)
+
+        total_reajustado += valor_reajustado
+
+        month_name = month_names[competencia_date.month - 1]
+        competencia_str = f"{month_name}/{competencia_date.year}"
+
+        table.append({
+            "competencia": competencia_str,
+            "valor_base": valor_base,
+            "valor_reajustado": valor_reajustado
+        })
+
+    return table, round(total_reajustado, 2)
+
+
+# --- Conferência ---
+
+def all_dates() -> list:
+    today = date.today()
+    dates = []
+    month = date(1994, 1, 1)
+    while month <= today:
+        for day in DAYS:
+            try:
+                dates.append(month.replace(day=day).isoformat())
+            except ValueError:
+                continue
+        month += relativedelta(months=1)
+    return dates + EXTRA_DATES
+
+
+def main() -> dict:
+    dates = all_dates()
+    calculations._payment_table.cache_clear()
+    mismatches = []
+
+    for raw in dates:
+        if raw and parse_date(raw):
+            if get_salary_for_date(raw) != legacy_get_salary_for_date(raw):
+                mismatches.append({'date': raw, 'check': 'get_salary_for_date'})
+            base = legacy_get_salary_for_date(raw)
+            if calculate_adjusted_value(base, raw) != legacy_calculate_adjusted_value(base, raw):
+                mismatches.append({'date': raw, 'check': 'calculate_adjusted_value'})
+
+    for months in MONTHS:
+        batch = generate_payment_tables_batch(dates, months)
+        for raw, batch_result in zip(dates, batch):
+            expected = legacy_generate_payment_table(raw, months)
+            if generate_payment_table(raw, months) != expected:
+                mismatches.append({'date': raw, 'months': months, 'check': 'generate_payment_table'})
+            if batch_result != expected:
+                mismatches.append({'date': raw, 'months': months, 'check': 'generate_payment_tables_batch'})
+
+    return {
+        'dates': len(dates),
+        'months': list(MONTHS),
+        'mismatches': len(mismatches),
+        'first_mismatches': mismatches[:10],
+    }
+
+
+if __name__ == '__main__':
+    result = main()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if result['mismatches'] else 0)
@@ -0,0 +1,430 @@
+"""Dublês offline para os benchmarks: OpenAI (chat completions) e Supabase (PostgREST).
+
+- `fake_chat_model(latency)`: ChatOpenAI de verdade sobre um transporte httpx que
+  responde /chat/completions com JSON válido para o schema pedido em
+  `response_format` (PeticaoAIOutput, EditorOutput, RevisorOutput, ReescritaOutput),
+  em JSON ou em text/event-stream quando a chamada pede `stream`.
+  Determinístico: a mesma chamada sempre recebe a mesma resposta.
+- `FakePostgREST`: tabelas em memória atrás de um transporte httpx que entende o
+  subconjunto do PostgREST usado pelo backend (select com embeds, filtros eq/neq/
+  in/ilike/like/is/gt/gte/lt/lte, order com nullsfirst/nullslast, limit/offset,
+  Prefer count=exact, insert, upsert, update, delete). `install()` troca o cliente de services/database.py,
+  então o caminho real (supabase-py, hooks de métricas e tracing) é exercitado.
+- `seed_jurisdiction` / `synthetic_jurisprudences`: dados de partida a partir de
+  data/jurisdiction_para.csv e jurisprudências sintéticas.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+from supabase import AsyncClientOptions, acreate_client
+
+from models.schemas import PeticaoAIOutput, EditorOutput, RevisorOutput, ReescritaOutput
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+JURISDICTION_CSV = os.path.join(DATA_DIR, 'jurisdiction_para.csv')
+
+# --- LLM ---
+
+DRAFT = {
+    "preliminares": "<h3>I.1 – DA GRATUIDADE DA JUSTIÇA</h3><p>Requer a gratuidade.</p>",
+    "resumo_fatos": "A autora é trabalhadora rural em regime de economia familiar.",
+    "dados_tecnicos": {
+        "motivo_indeferimento": "Falta de qualidade de segurada especial",
+        "tempo_atividade": "10 anos",
+        "periodo_rural_declarado": "Desde os 12 anos até a atualidade",
+        "ponto_controvertido": "Qualidade de Segurado Especial",
+        "beneficio_anterior": "Não consta",
+        "cnis_averbado": "Não constam vínculos",
+        "vinculo_urbano": "Nunca exerceu atividade urbana",
+        "profissao_formatada": "Agricultora (Economia Familiar)",
+    },
+    "lista_provas": ["Carteira de Sindicato"],
+    "correcoes": [],
+    "dados_cadastrais_corrigidos": None,
+}
+EDITS = {"edicoes": [{"campo": "resumo_fatos", "original": "trabalhadora rural", "correto": "lavradora"}]}
+APPROVED = {"aprovado": True, "apontamentos": []}
+REWRITE = {"resumo_fatos": "A autora é lavradora em regime de economia familiar desde os 12 anos."}
+
+# Resposta estruturada por nome do schema pedido em response_format (validadas no import)
+STRUCTURED = {
+    "PeticaoAIOutput": PeticaoAIOutput.model_validate(DRAFT).model_dump(mode='json'),
+    "EditorOutput": EditorOutput.model_validate(EDITS).model_dump(mode='json'),
+    "RevisorOutput": RevisorOutput.model_validate(APPROVED).model_dump(mode='json'),
+    "ReescritaOutput": ReescritaOutput.model_validate(REWRITE).model_dump(mode='json'),
+}
+
+
+def openai_handler(latency: float = 0.0, usage: Optional[dict] = None):
+    """Handler assíncrono de /chat/completions (para httpx.MockTransport).
+
+    Com `"stream": true` responde em text/event-stream (chunks de STREAM_CHUNK
+    caracteres e um chunk final de usage), espalhando `latency` entre os chunks:
+    o primeiro token chega antes do fim da resposta, como na API real.
+    """
+    usage = usage or {"prompt_tokens": 1000, "completion_tokens": 300, "total_tokens": 1300}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+        content = json.dumps(STRUCTURED[schema], ensure_ascii=False) if schema else "APROVADO"
+        if body.get("stream"):
+            return httpx.Response(200, content=_sse_chunks(body["model"], content, usage, latency),
+                                  headers={"content-type": "text/event-stream"})
+        if latency:
+            await asyncio.sleep(latency)
+        return httpx.Response(200, json={
+            "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+    return handle
+
+
+STREAM_CHUNK = 12
+
+
+async def _sse_chunks(model: str, content: str, usage: dict, latency: float):
+    base = {"id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    deltas = [{"role": "assistant", "content": ""}]
+    deltas += [{"content": content[i:i + STREAM_CHUNK]} for i in range(0, len(content), STREAM_CHUNK)]
+    delay = latency / len(deltas)
+    for delta in deltas:
+        if delay:
+            await asyncio.sleep(delay)
+        yield _sse_line({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+    yield _sse_line({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    yield _sse_line({**base, "choices": [], "usage": usage})
+    yield b"data: [DONE]\n\n"
+
+
+def _sse_line(data: dict) -> bytes:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def fake_chat_model(latency: float = 0.0) -> ChatOpenAI:
+    """ChatOpenAI apontado para o handler falso (feche `llm.http_async_client` ao final)."""
+    http = httpx.AsyncClient(transport=httpx.MockTransport(openai_handler(latency)))
+    return ChatOpenAI(model="gpt-4o", temperature=0, api_key="bench", http_async_client=http)
+
+
+# --- PostgREST ---
+
+# (tabela, coluna FK) -> tabela referenciada
+FOREIGN_KEYS = {
+    ('judicial_subsections', 'section_id'): 'judicial_sections',
+    ('jurisdiction_map', 'municipality_id'): 'municipalities',
+    ('jurisdiction_map', 'subsection_id'): 'judicial_subsections',
+}
+_OPS = ('eq', 'neq', 'in', 'ilike', 'like', 'is', 'gt', 'gte', 'lt', 'lte')
+
+
+class PostgRESTError(Exception):
+    pass
+
+
+def _text(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _split_top(expr: str) -> List[str]:
+    out, depth, cur = [], 0, ''
+    for ch in expr:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            out.append(cur)
+            cur = ''
+        else:
+            cur += ch
+    if cur:
+        out.append(cur)
+    return [c.strip() for c in out if c.strip()]
+
+
+def _like(pattern: str, flags=0):
+    return re.compile('^' + re.escape(pattern).replace('%', '.*').replace(r'\*', '.*') + '$', flags | re.S)
+
+
+def _compare(a, b):
+    try:
+        return float(a), float(b)
+    except (TypeError, ValueError):
+        return _text(a), _text(b)
+
+
+def _filter(column: str, expr: str):
+    negate = expr.startswith('not.')
+    if negate:
+        expr = expr[4:]
+    op, _, value = expr.partition('.')
+    if op not in _OPS or '.' in column:
+        raise PostgRESTError(f'filtro não suportado: {column}={expr}')
+    if op == 'in':
+        values = set(next(csv.reader([value.strip()[1:-1]], quotechar='"')) if value.strip() != '()' else [])
+        test = lambda v: _text(v) in values
+    elif op in ('ilike', 'like'):
+        rx = _like(value, re.I if op == 'ilike' else 0)
+        test = lambda v: v is not None and rx.match(str(v)) is not None
+    elif op == 'is':
+        test = lambda v: _text(v) == value.lower()
+    elif op == 'eq':
+        test = lambda v: _text(v) == value
+    elif op == 'neq':
+        test = lambda v: _text(v) != value
+    else:
+        cmp = {'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b,
+               'lt': lambda a, b: a < b, 'lte': lambda a, b: a <= b}[op]
+        test = lambda v: v is not None and cmp(*_compare(v, value))
+    return (lambda row: not test(row.get(column))) if negate else (lambda row: test(row.get(column)))
+
+
+class FakePostgREST:
+    """Banco em memória falando PostgREST via httpx.MockTransport."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {}
+        self.requests = 0
+        self._next_id: Dict[str, int] = {}
+
+    # --- dados ---
+
+    def insert_rows(self, table: str, rows: List[dict]) -> List[dict]:
+        stored = self.tables.setdefault(table, [])
+        created = []
+        for row in rows:
+            row = dict(row)
+            if row.get('id') is None:
+                self._next_id[table] = self._next_id.get(table, len(stored)) + 1
+                row['id'] = self._next_id[table]
+            stored.append(row)
+            created.append(dict(row))
+        return created
+
+    def _by_id(self, table: str, cache: dict) -> Dict[str, dict]:
+        if table not in cache:
+            cache[table] = {_text(r.get('id')): r for r in self.tables.get(table, [])}
+        return cache[table]
+
+    def _project(self, table: str, row: dict, columns: List[str], cache: dict) -> dict:
+        out = {}
+        for col in columns:
+            m = re.match(r'^(?:(\w+):)?(\w+)(?:!\w+)?\((.*)\)$', col, re.S)
+            if not m:
+                if col == '*':
+                    out.update(row)
+                else:
+                    alias, _, name = col.rpartition(':')
+                    out[alias or name] = row.get(name)
+                continue
+            alias, ref, sub = m.groups()
+            sub_cols = _split_top(sub) or ['*']
+            if (table, ref) in FOREIGN_KEYS:
+                target, fk = FOREIGN_KEYS[(table, ref)], ref
+            else:
+                target = ref
+                fk = next((c for (t, c), v in FOREIGN_KEYS.items() if t == table and v == ref), None)
+            if fk is not None:
+                child = self._by_id(target, cache).get(_text(row.get(fk)))
+                out[alias or ref] = self._project(target, child, sub_cols, cache) if child else None
+                continue
+            back = next((c for (t, c), v in FOREIGN_KEYS.items() if t == target and v == table), None)
+            if back is None:
+                raise PostgRESTError(f'relação desconhecida: {table} -> {ref}')
+            out[alias or ref] = [self._project(target, r, sub_cols, cache)
+                                 for r in self.tables.get(target, []) if _text(r.get(back)) == _text(row.get('id'))]
+        return out
+
+    # --- HTTP ---
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parts = [p for p in request.url.path.split('/') if p]
+        if len(parts) != 3 or parts[:2] != ['rest', 'v1']:
+            return httpx.Response(404, json={'message': f'rota não suportada: {request.url.path}'})
+        try:
+            return self._dispatch(parts[2], request)
+        except PostgRESTError as e:
+            return httpx.Response(400, json={'message': str(e), 'code': 'PGRST100'})
+
+    def _dispatch(self, table: str, request: httpx.Request) -> httpx.Response:
+        select, order, limit, offset, on_conflict = '*', None, None, 0, 'id'
+        filters = []
+        for key, value in request.url.params.multi_items():
+            if key == 'select':
+                select = value
+            elif key == 'order':
+                order = value
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'offset':
+                offset = int(value)
+            elif key == 'on_conflict':
+                on_conflict = value
+            elif key == 'columns':
+                continue
+            else:
+                filters.append(_filter(key, value))
+        prefer = request.headers.get('prefer', '')
+        representation = 'return=representation' in prefer
+        rows = [r for r in self.tables.setdefault(table, []) if all(f(r) for f in filters)]
+        cache: dict = {}
+
+        if request.method in ('GET', 'HEAD'):
+            total = len(rows)
+            for clause in reversed((order or '').split(',') if order else []):
+                col, *modifiers = clause.split('.')
+                desc = 'desc' in modifiers
+                # padrão do Postgres: nulos no fim em asc e no começo em desc
+                nulls_first = 'nullsfirst' in modifiers or (desc and 'nullslast' not in modifiers)
+                present = sorted((r for r in rows if r.get(col) is not None),
+                                 key=lambda r: _compare(r.get(col), 0)[0], reverse=desc)
+                nulls = [r for r in rows if r.get(col) is None]
+                rows = nulls + present if nulls_first else present + nulls
+            rows = rows[offset:offset + limit if limit is not None else None]
+            data = [self._project(table, r, _split_top(select), cache) for r in rows]
+            headers = {'content-range': f"{offset}-{offset + len(data) - 1 if data else '*'}/"
+                                        f"{total if 'count=exact' in prefer else '*'}"}
+            if 'vnd.pgrst.object' in request.headers.get('accept', ''):
+                if len(data) != 1:
+                    return httpx.Response(406, json={'message': 'JSON object requested, multiple (or no) rows returned',
+                                                     'code': 'PGRST116'})
+                return httpx.Response(200, json=data[0], headers=headers)
+            return httpx.Response(200, json=data, headers=headers)
+
+        if request.method == 'POST':
+            payload = json.loads(request.content or b'[]')
+            payload = payload if isinstance(payload, list) else [payload]
+            created = []
+            if 'resolution=merge-duplicates' in prefer:
+                index = {_text(r.get(on_conflict)): r for r in self.tables[table]}
+                fresh = []
+                for item in payload:
+                    existing = index.get(_text(item.get(on_conflict))) if item.get(on_conflict) is not None else None
+                    if existing is not None:
+                        existing.update(item)
+                        created.append(dict(existing))
+                    else:
+                        fresh.append(item)
+                created.extend(self.insert_rows(table, fresh))
+            else:
+                created = self.insert_rows(table, payload)
+            return httpx.Response(201, json=created if representation else None)
+
+        if request.method == 'PATCH':
+            changes = json.loads(request.content or b'{}')
+            for r in rows:
+                r.update(changes)
+            return httpx.Response(200, json=[dict(r) for r in rows] if representation else None)
+
+        if request.method == 'DELETE':
+            doomed = {id(r) for r in rows}
+            self.tables[table] = [r for r in self.tables[table] if id(r) not in doomed]
+            return httpx.Response(200, json=[dict(r) for r in rows] if representation else None)
+
+        return httpx.Response(405, json={'message': f'método não suportado: {request.method}'})
+
+    async def install(self):
+        """Substitui o cliente compartilhado de services/database.py por um apontado para este banco."""
+        from services import database
+        await database.close_supabase()
+        http = httpx.AsyncClient(
+            transport=httpx.MockTransport(self.handle),
+            event_hooks=database._event_hooks(database.supabase_event_hooks(), database.supabase_trace_hooks()),
+        )
+        options = AsyncClientOptions(httpx_client=http, auto_refresh_token=False, persist_session=False)
+        database._http = http
+        database._client = await acreate_client('https://bench.supabase.co', 'bench-key', options=options)
+        return database._client
+
+
+# --- Dados de partida ---
+
+def read_jurisdiction_csv(path: str = JURISDICTION_CSV) -> List[dict]:
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def seed_jurisdiction(db: FakePostgREST, rows: Optional[List[dict]] = None):
+    """Popula seções, subseções, municípios e mapeamentos a partir das linhas do CSV."""
+    sections, subsections, municipalities = {}, {}, {}
+    for row in rows if rows is not None else read_jurisdiction_csv():
+        section = row['section'].strip()
+        if section not in sections:
+            sections[section] = db.insert_rows('judicial_sections', [{'name': section}])[0]
+        sub_key = (section, row['subsection'].strip())
+        if sub_key not in subsections:
+            subsections[sub_key] = db.insert_rows('judicial_subsections', [{
+                'name': sub_key[1], 'city': sub_key[1], 'has_jef': True, 'section_id': sections[section]['id'],
+            }])[0]
+        mun_key = (row['state'].strip().upper(), row['municipality'].strip())
+        if mun_key not in municipalities:
+            municipalities[mun_key] = db.insert_rows('municipalities', [{'name': mun_key[1], 'state': mun_key[0]}])[0]
+            db.insert_rows('jurisdiction_map', [{
+                'municipality_id': municipalities[mun_key]['id'],
+                'subsection_id': subsections[sub_key]['id'],
+                'legal_basis': row.get('legal_basis'),
+            }])
+
+
+_COURTS = ('TRF1', 'TRF3', 'TRF4', 'TRF5', 'TNU', 'STJ')
+_TOPICS = (
+    'salário-maternidade rural', 'segurada especial', 'início de prova material', 'economia familiar',
+    'carência', 'qualidade de segurado', 'prova testemunhal', 'aposentadoria por idade rural',
+    'auxílio-doença', 'benefício assistencial', 'coisa julgada', 'tutela de urgência',
+)
+_CLAUSES = (
+    'é suficiente o início de prova material contemporâneo', 'corroborado por prova testemunhal idônea',
+    'dispensada a comprovação de recolhimentos', 'o trabalho urbano de membro da família não descaracteriza',
+    'a extinção sem resolução de mérito não impede nova ação', 'documentos em nome dos pais são aceitos',
+    'a carteira do sindicato rural serve como indício', 'a autodeclaração deve ser ratificada',
+)
+
+
+def synthetic_jurisprudences(n: int, seed: int = 42) -> List[dict]:
+    """Jurisprudências sintéticas, determinísticas para um mesmo `seed`."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        topics = rnd.sample(_TOPICS, 3)
+        clauses = rnd.sample(_CLAUSES, 3)
+        court = rnd.choice(_COURTS)
+        rows.append({
+            'title': f'{court} - {topics[0].capitalize()} nº {1000 + i}',
+            'citation': f'{court} AC {rnd.randint(100000, 999999)}-{rnd.randint(10, 99)}.{2015 + i % 10}',
+            'court': court,
+            'date': f'{2015 + i % 10}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            'summary': f'{topics[0].capitalize()}: {clauses[0]}, {clauses[1]}. Tema: {topics[1]}, {topics[2]}.',
+            'full_text': ' '.join(clauses) + '. ' + ' '.join(topics) + '.',
+            'tags': topics,
+            'source_url': f'https://jurisprudencia.example/{court.lower()}/{i}',
+        })
+    return rows
+
+
+def jurisprudence_csv(n: int, seed: int = 7) -> bytes:
+    """CSV no formato do import de jurisprudências (tags separadas por ';')."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=['title', 'citation', 'court', 'date', 'summary', 'full_text', 'tags', 'source_url'])
+    writer.writeheader()
+    for row in synthetic_jurisprudences(n, seed):
+        writer.writerow({**row, 'tags': ';'.join(row['tags'])})
+    return buf.getvalue().encode('utf-8')
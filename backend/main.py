@@ -1,8 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from api.router import api_router # Importa o router central
+from services.database import close_supabase
+from services.executor import shutdown_executor
+from services.llm_cache import llm_cache
+from services.jobs import job_queue
+from services.metrics import MetricsMiddleware, CONTENT_TYPE, render as render_metrics
+from services.tracing import TracingMiddleware, REQUEST_ID_HEADER
 
-app = FastAPI(title="PrevAI API", version="2.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers da fila de geração (services/jobs.py)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    # Fecha o pool HTTP compartilhado do Supabase
+    await close_supabase()
+    shutdown_executor()
+    llm_cache.close()
+
+
+app = FastAPI(title="PrevAI API", version="2.0", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",           # Para você continuar trabalhando local
@@ -17,11 +38,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
+# Latência e contagem por rota para o /metrics
+app.add_middleware(MetricsMiddleware)
+# Trace por requisição (X-Request-ID); ver /api/debug/traces
+app.add_middleware(TracingMiddleware)
+
 # Registra todas as rotas com o prefixo /api
 app.include_router(api_router, prefix="/api")
 
 @app.get("/")
 def root():
-    return {"status": "Backend Python Online 🚀"}
\ No newline at end of file
+    return {"status": "Backend Python Online 🚀"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Formato texto do Prometheus (services/metrics.py)
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any
+from typing import List, Literal, Optional, Any
 
 # --- 1. NOVO MODELO: Correção de Dados Cadastrais ---
 class DadosCadastraisCorrigidos(BaseModel):
@@ -17,6 +17,33 @@ class CorrecaoItem(BaseModel):
     original: str = Field(description="Trecho original com erro")
     correto: str = Field(description="Versão corrigida")
 
+# --- 2.1 Edições do Editor (só campos de texto corrido) ---
+CAMPOS_EDITAVEIS = ('resumo_fatos', 'preliminares')
+
+class EdicaoTexto(BaseModel):
+    campo: Literal['resumo_fatos', 'preliminares'] = Field(description="Campo do rascunho editado")
+    original: str = Field(description="Trecho exato do texto atual (copiado literalmente)")
+    correto: str = Field(description="Trecho que substitui o original")
+
+class EditorOutput(BaseModel):
+    edicoes: List[EdicaoTexto] = Field(default_factory=list, description="Lista de substituições pontuais; vazia se nada precisar mudar")
+
+# --- 2.2 Apontamentos do Revisor (por campo) e reescrita pontual ---
+CAMPOS_REVISAVEIS = ('resumo_fatos', 'lista_provas', 'preliminares')
+
+class ApontamentoRevisao(BaseModel):
+    campo: Literal['resumo_fatos', 'lista_provas', 'preliminares'] = Field(description="Campo do rascunho com o problema")
+    problema: str = Field(description="Erro encontrado e o que precisa mudar (curto)")
+
+class RevisorOutput(BaseModel):
+    aprovado: bool = Field(description="True se a peça pode seguir sem alterações")
+    apontamentos: List[ApontamentoRevisao] = Field(default_factory=list, description="Problemas por campo; vazia se aprovado")
+
+class ReescritaOutput(BaseModel):
+    resumo_fatos: Optional[str] = Field(None, description="Novo texto, só se o campo foi apontado")
+    lista_provas: Optional[List[str]] = Field(None, description="Nova lista, só se o campo foi apontado")
+    preliminares: Optional[str] = Field(None, description="Novo HTML das preliminares, só se o campo foi apontado")
+
 # --- 3. Dados Técnicos (MANTIDO) ---
 class DadosTecnicos(BaseModel):
     motivo_indeferimento: str = Field(description="Motivo formal corrigido")
@@ -65,6 +92,8 @@ class GenerateRequest(BaseModel):
     clientName: str
     details: str
     clientData: ClientData
+    # Ignora respostas guardadas no cache do LLM (a resposta nova substitui a antiga)
+    bypassCache: bool = False
 
 class GenerateResponse(BaseModel):
     resumo_fatos: str
@@ -81,4 +110,6 @@ class GenerateResponse(BaseModel):
     
     jurisprudencias_selecionadas: List[dict]
     tabela_calculo: List[Any] = []
-    valor_causa_extenso: str = "A calcular"
\ No newline at end of file
+    valor_causa_extenso: str = "A calcular"
+    # Tokens por nó do grafo (prompt/completion/cache) desta geração
+    token_usage: Optional[dict] = None
\ No newline at end of file
@@ -0,0 +1,190 @@
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import jwt
+from cachetools import TLRUCache, TTLCache
+from fastapi import HTTPException
+
+from services.executor import run_blocking
+
+# Verificação local dos JWTs do Supabase Auth: HS256 com o JWT secret do projeto
+# ou chaves assimétricas via JWKS. Sem nenhum dos dois, cai no auth.get_user remoto.
+JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+JWT_LEEWAY = int(os.getenv('SUPABASE_JWT_LEEWAY', '10'))
+CLAIMS_TTL = float(os.getenv('AUTH_CLAIMS_TTL', '300'))
+ROLE_TTL = float(os.getenv('AUTH_ROLE_TTL', '60'))
+CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '4096'))
+# Só para tokens revogados sem `exp` legível; os demais ficam revogados até o próprio `exp`
+REVOCATION_TTL = float(os.getenv('AUTH_REVOCATION_TTL', '3600'))
+
+
+@dataclass
+class AuthenticatedUser:
+    id: str
+    email: Optional[str] = None
+    claims: dict = field(default_factory=dict)
+    expires_at: Optional[float] = None
+
+
+def _claims_ttu(_key, user: AuthenticatedUser, now: float) -> float:
+    # nunca mantém no cache além do `exp` do próprio token
+    ttl = CLAIMS_TTL
+    if user.expires_at:
+        ttl = min(ttl, user.expires_at - time.time())
+    return now + max(ttl, 0)
+
+
+def _revoked_ttu(_key, expires_at: Optional[float], now: float) -> float:
+    # revogado até o `exp` do token (mais a tolerância do decode): depois disso ele já é recusado
+    ttl = expires_at - time.time() + JWT_LEEWAY if expires_at else REVOCATION_TTL
+    return now + max(ttl, 0)
+
+
+_claims_cache = TLRUCache(maxsize=CACHE_SIZE, ttu=_claims_ttu)
+_role_cache = TTLCache(maxsize=CACHE_SIZE, ttl=ROLE_TTL)
+# sem limite de tamanho: despejar uma entrada reabilitaria um token revogado
+_revoked = TLRUCache(maxsize=math.inf, ttu=_revoked_ttu)
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
+
+def _get_jwks_client() -> Optional[jwt.PyJWKClient]:
+    global _jwks_client
+    if _jwks_client is None:
+        url = os.getenv('SUPABASE_URL')
+        if not url:
+            return None
+        _jwks_client = jwt.PyJWKClient(
+            f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+            headers={'apikey': os.getenv('SUPABASE_KEY', '')},
+        )
+    return _jwks_client
+
+
+def _user_from_claims(claims: dict) -> AuthenticatedUser:
+    return AuthenticatedUser(
+        id=claims.get('sub'),
+        email=claims.get('email'),
+        claims=claims,
+        expires_at=claims.get('exp'),
+    )
+
+
+async def _decode_locally(token: str) -> Optional[AuthenticatedUser]:
+    """Decodifica e valida o token sem rede. Retorna None se não houver chave local configurada."""
+    alg = jwt.get_unverified_header(token).get('alg')
+    options = {'require': ['exp', 'sub']}
+    if alg == 'HS256':
+        if not JWT_SECRET:
+            return None
+        claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'], audience=JWT_AUDIENCE,
+                            leeway=JWT_LEEWAY, options=options)
+        return _user_from_claims(claims)
+
+    jwks = _get_jwks_client()
+    if not jwks:
+        return None
+    # o JWKS é buscado (e cacheado) pelo PyJWKClient, que é síncrono
+    signing_key = await run_blocking(jwks.get_signing_key_from_jwt, token)
+    claims = jwt.decode(token, signing_key.key, algorithms=['RS256', 'ES256'], audience=JWT_AUDIENCE,
+                        leeway=JWT_LEEWAY, options=options)
+    return _user_from_claims(claims)
+
+
+async def _fetch_remote(token: str, supabase) -> Optional[AuthenticatedUser]:
+    res = await supabase.auth.get_user(token)
+    user = getattr(res, 'user', None)
+    if not user:
+        return None
+    return AuthenticatedUser(id=user.id, email=getattr(user, 'email', None))
+
+
+def bearer_token(authorization: Optional[str]) -> str:
+    """Extrai o token do header `Authorization: Bearer <token>`."""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Token de autenticação ausente.")
+    try:
+        return authorization.split(" ")[1]
+    except IndexError:
+        raise HTTPException(status_code=401, detail="Acesso negado.")
+
+
+async def authenticate(authorization: Optional[str], supabase) -> AuthenticatedUser:
+    token = bearer_token(authorization)
+
+    if token in _revoked:
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada.")
+
+    cached = _claims_cache.get(token)
+    if cached:
+        return cached
+
+    try:
+        user = await _decode_locally(token)
+        if user is None:
+            user = await _fetch_remote(token, supabase)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada.")
+    except Exception as e:
+        print(f"❌ Erro de Auth: {e}")
+        raise HTTPException(status_code=401, detail="Acesso negado.")
+
+    if not user or not user.id:
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada.")
+    _claims_cache[token] = user
+    return user
+
+
+async def get_role(user_id: str, supabase) -> Optional[str]:
+    if user_id in _role_cache:
+        return _role_cache[user_id]
+    prof = await supabase.table('profiles').select('role').eq('id', user_id).maybe_single().execute()
+    data = getattr(prof, 'data', None) or {}
+    role = data.get('role') if isinstance(data, dict) else None
+    _role_cache[user_id] = role
+    return role
+
+
+async def require_admin(authorization: Optional[str], supabase) -> str:
+    user = await authenticate(authorization, supabase)
+    try:
+        role = await get_role(user.id, supabase)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Acesso negado.")
+    if role != 'admin':
+        raise HTTPException(status_code=403, detail='Admin role required')
+    return user.id
+
+
+# --- Hooks de revogação/refresh ---
+
+def forget_token(token: str):
+    """Descarta as claims cacheadas; o próximo request revalida o token."""
+    _claims_cache.pop(token, None)
+
+
+def revoke_token(token: str):
+    """Rejeita o token imediatamente (ex.: logout) mesmo que a assinatura ainda seja válida.
+
+    A revogação vale até o `exp` do token e só neste processo.
+    """
+    cached = _claims_cache.pop(token, None)
+    expires_at = cached.expires_at if cached else None
+    if not expires_at:
+        try:
+            expires_at = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.PyJWTError:
+            expires_at = None
+    _revoked[token] = expires_at
+
+
+def invalidate_role(user_id: Optional[str] = None):
+    """Descarta o papel cacheado de um usuário (ou de todos) para refletir mudanças de role."""
+    if user_id is None:
+        _role_cache.clear()
+    else:
+        _role_cache.pop(user_id, None)
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+def _consume_exception(fut: asyncio.Future):
+    # evita "Future exception was never retrieved" quando ninguém estava esperando
+    if not fut.cancelled():
+        fut.exception()
+
+
+class AsyncTTLCache:
+    """Cache LRU com TTL para corrotinas, com single-flight.
+
+    Misses concorrentes da mesma chave compartilham uma única chamada ao loader.
+    Exceções do loader não são cacheadas. Contadores ficam em `stats()`.
+    Cada `invalidate()` avança `_generation`: um load iniciado antes não grava o
+    resultado (possivelmente antigo) nem é compartilhado com chamadas posteriores.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # chave -> (future, geração em que o load começou)
+        self._inflight: dict = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _get_fresh(self, key) -> tuple:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._get_fresh(key)
+        if found:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] == self._generation:
+            self.coalesced += 1
+            return await asyncio.shield(inflight[0])
+
+        self.misses += 1
+        generation = self._generation
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_consume_exception)
+        self._inflight[key] = (fut, generation)
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            if generation == self._generation:
+                self._store(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key, (None,))[0] is fut:
+                del self._inflight[key]
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """Remove todas as entradas, ou só as chaves em que `predicate(key)` é verdadeiro."""
+        self._generation += 1
+        if predicate is None:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            return
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
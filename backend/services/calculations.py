@@ -1,6 +1,9 @@
+from bisect import bisect_right
 from datetime import datetime, date
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 from num2words import num2words
+import numpy as np
 
 # Dados históricos (Cópia fiel do seu TS)
 SALARY_HISTORY = [
@@ -51,63 +54,139 @@ def parse_date(date_input):
             return datetime.now().date()
     return date_input
 
+# --- Histórico compilado uma única vez ---
+# Ordem crescente de vigência: busca binária pela data e produtos acumulados dos reajustes.
+_HISTORY_ASC = list(reversed(SALARY_HISTORY))
+_VIGENCIAS = [datetime.strptime(s["vigencia"], "%Y-%m-%d").date().toordinal() for s in _HISTORY_ASC]
+_VALORES = [s["valor"] for s in _HISTORY_ASC]
+_FATORES = [1 + s["reajuste"] / 100 for s in _HISTORY_ASC]
+# _PRODUTOS[i] = produto dos fatores das vigências 0..i-1
+_PRODUTOS = [1.0]
+for _fator in _FATORES:
+    _PRODUTOS.append(_PRODUTOS[-1] * _fator)
+
+MONTH_NAMES = [
+    'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+def _vigencia_index(target) -> int:
+    """Quantidade de vigências <= target (o salário vigente é o índice anterior)."""
+    return bisect_right(_VIGENCIAS, target.toordinal())
+
 def get_salary_for_date(target_date):
     target = parse_date(target_date)
-    
-    for salary in SALARY_HISTORY:
-        vigencia = datetime.strptime(salary["vigencia"], "%Y-%m-%d").date()
-        if target >= vigencia:
-            return salary["valor"]
-            
-    return SALARY_HISTORY[-1]["valor"]
-
-def calculate_adjusted_value(base_value, base_date):
+    idx = _vigencia_index(target)
+    return _VALORES[idx - 1] if idx else _VALORES[0]
+
+def calculate_adjusted_value(base_value, base_date, reference_date=None):
     base_dt = parse_date(base_date)
-    today = datetime.now().date()
-    
+    today = reference_date or datetime.now().date()
+
+    # Reajustes com vigência > data_base e vigência <= hoje: fatias [start, stop)
+    start = _vigencia_index(base_dt)
+    stop = _vigencia_index(today)
     adjusted_value = float(base_value)
-    
-    for salary in SALARY_HISTORY:
-        vigencia = datetime.strptime(salary["vigencia"], "%Y-%m-%d").date()
-        
-        # Lógica original: Se vigência > data_base e vigência <= hoje
-        if vigencia > base_dt and vigencia <= today:
-            adjusted_value = adjusted_value * (1 + salary["reajuste"] / 100)
-            
+    if stop > start:
+        adjusted_value = adjusted_value * _PRODUTOS[stop] / _PRODUTOS[start]
     return round(adjusted_value, 2)
 
-def generate_payment_table(birth_date_str: str, months=4):
-    if not birth_date_str:
-        return [], 0.0
+@lru_cache(maxsize=8)
+def _adjusted_by_index(stop: int) -> tuple:
+    """Valor reajustado de cada salário do histórico, para uma data de referência.
 
-    birth_date = parse_date(birth_date_str)
+    Aplica os fatores na mesma ordem da implementação original (do mais recente
+    para o mais antigo), então o arredondamento é idêntico ao laço campo a campo.
+    Índice `start` = número de vigências <= competência.
+    """
     table = []
+    for start in range(len(_VIGENCIAS) + 1):
+        value = float(_VALORES[start - 1] if start else _VALORES[0])
+        for i in range(stop - 1, start - 1, -1):
+            value = value * _FATORES[i]
+        table.append(round(value, 2))
+    return tuple(table)
+
+@lru_cache(maxsize=4096)
+def _payment_table(birth_date: date, months: int, today: date) -> tuple:
+    adjusted = _adjusted_by_index(_vigencia_index(today))
+    rows = []
     total_reajustado = 0.0
-    
-    month_names = [
-        'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
-        'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
-    ]
-    
     for i in range(months):
         # Soma meses à data
         competencia_date = birth_date + relativedelta(months=+i)
-        
-        valor_base = get_salary_for_date(competencia_date)
-        valor_reajustado = calculate_adjusted_value(valor_base, competencia_date)
-        
+        idx = _vigencia_index(competencia_date)
+        valor_base = _VALORES[idx - 1] if idx else _VALORES[0]
+        valor_reajustado = adjusted[idx]
         total_reajustado += valor_reajustado
-        
-        month_name = month_names[competencia_date.month - 1]
-        competencia_str = f"{month_name}/{competencia_date.year}"
-        
-        table.append({
-            "competencia": competencia_str,
-            "valor_base": valor_base,
-            "valor_reajustado": valor_reajustado
-        })
-        
-    return table, round(total_reajustado, 2)
+        competencia_str = f"{MONTH_NAMES[competencia_date.month - 1]}/{competencia_date.year}"
+        rows.append((competencia_str, valor_base, valor_reajustado))
+    return tuple(rows), round(total_reajustado, 2)
+
+def generate_payment_table(birth_date_str: str, months=4):
+    if not birth_date_str:
+        return [], 0.0
 
+    birth_date = parse_date(birth_date_str)
+    # Memoizado por (data, meses, data de referência); devolve sempre listas novas
+    rows, total = _payment_table(birth_date, months, datetime.now().date())
+    table = [
+        {"competencia": c, "valor_base": base, "valor_reajustado": adj}
+        for c, base, adj in rows
+    ]
+    return table, total
+
+@lru_cache(maxsize=4096)
 def get_valor_extenso(valor: float) -> str:
-    return num2words(valor, lang='pt_BR', to='currency')
\ No newline at end of file
+    return num2words(valor, lang='pt_BR', to='currency')
+
+# --- Cálculo em lote (NumPy) ---
+# Vigências sempre começam no dia 1: o salário de uma competência depende só do
+# mês (ano*12 + mês), então o lote inteiro vira um searchsorted sobre inteiros.
+_VIGENCIA_MONTHS = np.array(
+    [date.fromordinal(o).year * 12 + date.fromordinal(o).month - 1 for o in _VIGENCIAS],
+    dtype=np.int64
+)
+_VALORES_BY_INDEX = np.array([_VALORES[0]] + _VALORES, dtype=np.float64)
+
+def generate_payment_tables_batch(birth_dates: list, months: int = 4, reference_date=None) -> list:
+    """Tabelas de pagamento de vários clientes de uma vez.
+
+    Retorna, na ordem de entrada, (tabela, total) com os mesmos valores de
+    `generate_payment_table` para cada data.
+    """
+    today = reference_date or datetime.now().date()
+    adjusted = np.array(_adjusted_by_index(_vigencia_index(today)), dtype=np.float64)
+
+    results = [([], 0.0) for _ in birth_dates]
+    positions, starts = [], []
+    for pos, raw in enumerate(birth_dates):
+        if not raw:
+            continue
+        birth = parse_date(raw)
+        positions.append(pos)
+        starts.append(birth.year * 12 + birth.month - 1)
+    if not positions or months <= 0:
+        return results
+
+    # (N, meses): mês absoluto de cada competência -> índice de vigência
+    month_idx = np.asarray(starts, dtype=np.int64)[:, None] + np.arange(months, dtype=np.int64)
+    vig_idx = np.searchsorted(_VIGENCIA_MONTHS, month_idx, side='right')
+    base = _VALORES_BY_INDEX[vig_idx]
+    reaj = adjusted[vig_idx]
+    # soma acumulada da esquerda para a direita = mesma ordem do laço escalar
+    totals = np.cumsum(reaj, axis=1)[:, -1]
+
+    # rótulos "Mês/Ano" calculados uma vez por mês distinto
+    unique_months, inverse = np.unique(month_idx, return_inverse=True)
+    labels = [f"{MONTH_NAMES[m % 12]}/{m // 12}" for m in unique_months.tolist()]
+    inverse = inverse.reshape(month_idx.shape).tolist()
+
+    base_rows, reaj_rows, total_list = base.tolist(), reaj.tolist(), totals.tolist()
+    for row, pos in enumerate(positions):
+        table = [
+            {"competencia": labels[label], "valor_base": b, "valor_reajustado": r}
+            for label, b, r in zip(inverse[row], base_rows[row], reaj_rows[row])
+        ]
+        results[pos] = (table, round(total_list[row], 2))
+    return results
@@ -0,0 +1,76 @@
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
+
+from services.metrics import supabase_event_hooks
+from services.tracing import supabase_trace_hooks
+
+load_dotenv()
+
+# Camada de acesso a dados: um único cliente Supabase assíncrono por processo,
+# apoiado em um pool httpx (HTTP/2 + keep-alive) compartilhado por PostgREST e Auth.
+_client: Optional[AsyncClient] = None
+_http: Optional[httpx.AsyncClient] = None
+_lock = asyncio.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '20')),
+        max_keepalive_connections=int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '10')),
+        keepalive_expiry=float(os.getenv('SUPABASE_POOL_KEEPALIVE_EXPIRY', '30')),
+    )
+
+
+def _event_hooks(*hook_sets: dict) -> dict:
+    hooks = {'request': [], 'response': []}
+    for hook_set in hook_sets:
+        for event, fns in hook_set.items():
+            hooks[event].extend(fns)
+    return hooks
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        limits=_pool_limits(),
+        timeout=httpx.Timeout(float(os.getenv('SUPABASE_HTTP_TIMEOUT', '30'))),
+        follow_redirects=True,
+        # métricas por tabela (services/metrics.py) e spans por requisição (services/tracing.py)
+        event_hooks=_event_hooks(supabase_event_hooks(), supabase_trace_hooks()),
+    )
+
+
+async def get_supabase() -> AsyncClient:
+    """Retorna o cliente compartilhado (também usado como dependência FastAPI)."""
+    global _client, _http
+    if _client is not None:
+        return _client
+    async with _lock:
+        if _client is None:
+            url = os.getenv('SUPABASE_URL')
+            key = os.getenv('SUPABASE_KEY')
+            if not url or not key:
+                raise ValueError("Supabase configuration missing (SUPABASE_URL/SUPABASE_KEY)")
+            _http = _build_http_client()
+            options = AsyncClientOptions(
+                httpx_client=_http,
+                auto_refresh_token=False,
+                persist_session=False,
+            )
+            _client = await acreate_client(url, key, options=options)
+    return _client
+
+
+async def close_supabase():
+    """Fecha o pool HTTP; chamado no shutdown da aplicação."""
+    global _client, _http
+    http = _http
+    _client = None
+    _http = None
+    if http is not None:
+        await http.aclose()
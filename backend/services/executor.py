@@ -0,0 +1,21 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool dedicado e limitado para trabalho bloqueante (parsing de planilhas, CPU),
+# para que nada disso rode direto no event loop do uvicorn.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BLOCKING_POOL_SIZE', '4')),
+    thread_name_prefix='prevai-blocking',
+)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Executa `fn` no pool bloqueante e aguarda o resultado sem travar o loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from supabase import AsyncClient
+
+# Modelos e Schemas
+from models.schemas import GenerateRequest, GenerateResponse
+
+# Import do Grafo de Agentes
+from agents.workflow import app_graph
+
+# Serviços
+from services.search import search_relevant_jurisprudence, search_judicial_subsection
+from services.calculations import generate_payment_table, get_valor_extenso
+from services.tokens import compact_json
+from services.metrics import generation_duration, generations_in_flight
+from services.tracing import span, traced
+
+# Orçamento dos dados cadastrais no prompt; acima dele saem primeiro os campos menos úteis
+CLIENT_DATA_TOKENS = int(os.getenv('CLIENT_DATA_TOKENS', '1200'))
+CLIENT_DATA_DROP_ORDER = ('zip_code', 'cpf', 'neighborhood', 'details', 'children')
+
+# Nós do grafo reportados no streaming (entrada e saída com tempo)
+GRAPH_NODES = ('researcher', 'strategist', 'calculator', 'writer', 'editor', 'validator', 'reviewer', 'reviser')
+# Campo do rascunho do Writer transmitido token a token
+STREAM_FIELD = 'resumo_fatos'
+
+
+@traced()
+async def prepare_generation(request: GenerateRequest, supabase: AsyncClient) -> dict:
+    """Pesquisa, competência, cálculos e instrução do agente: tudo que roda antes do LLM.
+
+    Retorna `graph_input` (estado inicial do grafo) e `context` (dados usados
+    na montagem do GenerateResponse).
+    """
+    # =========================================================================
+    # 1. PRÉ-PROCESSAMENTO (Python Puro)
+    # =========================================================================
+    print("🔍 [1/3] Executando Pesquisa Jurisprudencial e de Competência...")
+
+    # Dispara buscas
+    juris_task = search_relevant_jurisprudence(
+        f"{request.docType} rural recentes",
+        facts=f"{request.details}\n{request.clientData.details}",
+        k=3
+    )
+    subsection_task = search_judicial_subsection(
+        request.clientData.address,
+        city=request.clientData.city,
+        state=request.clientData.state
+    )
+
+    raw_jurisprudencias, juris_data = await asyncio.gather(juris_task, subsection_task)
+
+    # DEFINIÇÃO DO INSS ADDRESS (Obrigatório para o GenerateResponse)
+    inss_address = None # Deixa o frontend usar o fallback se necessário
+
+    # Formata jurisprudência
+    juris_text = "\n".join([f"- {j['title']}: {j['snippet']}" for j in raw_jurisprudencias])
+    if not juris_text:
+        juris_text = "Nenhuma jurisprudência específica encontrada no banco de dados local."
+
+    print("💰 [2/3] Executando Cálculos Previdenciários...")
+
+    # Cálculos
+    data_nascimento = getattr(request.clientData, 'child_birth_date', None)
+    if not data_nascimento and request.clientData.children:
+        data_nascimento = request.clientData.children[0].get('birth_date')
+
+    with span("calculations"):
+        tabela, valor_total = generate_payment_table(data_nascimento)
+        valor_extenso = get_valor_extenso(valor_total)
+
+    calc_text = f"Valor Total da Causa: R$ {valor_total}. Tabela gerada com {len(tabela)} competências mensais."
+
+    # =========================================================================
+    # 2. INTELIGÊNCIA ARTIFICIAL (LangGraph)
+    # =========================================================================
+    print(f"🤖 [3/3] Acionando Agente Jurídico: '{request.agentSlug}'")
+
+    # Busca instrução
+    agent_res = await supabase.table('ai_agents').select('system_instruction').eq('slug', request.agentSlug).execute()
+    system_instruction = agent_res.data[0].get('system_instruction') if agent_res.data else None
+
+    # Contexto: dados cadastrais sem campos vazios, sem repetir os detalhes do caso e dentro do orçamento
+    dados_formais = request.clientData.model_dump()
+    if (dados_formais.get('details') or '').strip() == (request.details or '').strip():
+        dados_formais.pop('details', None)
+    dados_formais_json = compact_json(dados_formais, CLIENT_DATA_TOKENS, drop_order=CLIENT_DATA_DROP_ORDER)
+
+    contexto_cliente = f"""
+    Cliente: {request.clientName}
+    Detalhes do Caso: {request.details}
+    Dados Formais (JSON): {dados_formais_json}
+    Endereço INSS: {inss_address}
+    """
+
+    graph_input = {
+        "input_text": contexto_cliente,
+        "doc_type": request.docType,
+        "client_data": request.clientData.model_dump(),
+        "research_results": juris_text,
+        "calc_results": calc_text,
+        "system_instruction": system_instruction,
+        "revision_count": 0,
+        "quality_score": 0,
+        "review_comments": "",
+        "bypass_cache": request.bypassCache
+    }
+    context = {
+        "raw_jurisprudencias": raw_jurisprudencias,
+        "juris_data": juris_data,
+        "inss_address": inss_address,
+        "tabela": tabela,
+        "valor_extenso": valor_extenso,
+    }
+    return {"graph_input": graph_input, "context": context}
+
+
+def build_response(result: dict, context: dict) -> GenerateResponse:
+    """Estado final do grafo + dados do pré-processamento -> GenerateResponse."""
+    # Recupera Draft
+    ai_data = result.get("draft") or result.get("final_output")
+
+    if not ai_data:
+        raise ValueError("O Agente falhou em gerar o documento final (Draft não encontrado).")
+
+    # =========================================================================
+    # 3. MONTAGEM DA RESPOSTA (JSON para o Frontend)
+    # =========================================================================
+
+    # Formatações extras
+    juris_formatada = [
+        {"tribunal": j["title"], "ementa": j["snippet"], "referencia": j["link"]}
+        for j in context["raw_jurisprudencias"]
+    ]
+
+    juris_data = context["juris_data"]
+    cidade_uf = "Não localizado"
+    if isinstance(juris_data, dict):
+        c = juris_data.get('city', '')
+        s = juris_data.get('state', '')
+        if c and s:
+            cidade_uf = f"{c}-{s}"
+
+    # Verifica se há correções cadastrais
+    # Importante: ai_data.dados_cadastrais_corrigidos é um objeto Pydantic ou None
+    correcao_cadastral_dict = None
+    if ai_data.dados_cadastrais_corrigidos:
+        correcao_cadastral_dict = ai_data.dados_cadastrais_corrigidos.model_dump()
+
+    return GenerateResponse(
+        resumo_fatos=ai_data.resumo_fatos,
+        preliminares=getattr(ai_data, 'preliminares', None),
+        dados_tecnicos=ai_data.dados_tecnicos.model_dump(),
+        lista_provas=ai_data.lista_provas,
+        correcoes=getattr(ai_data, 'correcoes', []),
+
+        # Sanitização (Correção Cadastral)
+        dados_cadastrais=correcao_cadastral_dict,
+
+        # Dados do Python (AQUI ESTAVA O ERRO POTENCIAL)
+        inss_address=context["inss_address"],
+        end_cidade_uf=cidade_uf,
+        jurisdiction=juris_data if isinstance(juris_data, dict) else None,
+
+        # Listas e Tabelas
+        jurisprudencias_selecionadas=juris_formatada[:3],
+        tabela_calculo=context["tabela"],
+        valor_causa_extenso=context["valor_extenso"],
+        token_usage=result.get("token_usage")
+    )
+
+
+async def run_generation(request: GenerateRequest, supabase: AsyncClient) -> GenerateResponse:
+    """Pipeline completo: pré-processamento, grafo e montagem da resposta."""
+    started = time.perf_counter()
+    outcome = "error"
+    generations_in_flight.inc()
+    try:
+        prepared = await prepare_generation(request, supabase)
+        async with span("graph"):
+            result = await app_graph.ainvoke(prepared["graph_input"])
+        response = build_response(result, prepared["context"])
+        outcome = "ok"
+        return response
+    finally:
+        generations_in_flight.dec()
+        generation_duration.observe(time.perf_counter() - started, mode="sync", outcome=outcome)
+
+
+# --- Streaming ---
+
+def partial_json_string(buffer: str, field: str) -> Optional[str]:
+    """Valor (decodificado até onde já chegou) de um campo string num JSON incompleto.
+
+    Retorna None enquanto a chave ainda não apareceu no buffer. Escapes
+    incompletos no fim do buffer ficam para a próxima chamada.
+    """
+    marker = f'"{field}"'
+    pos = buffer.find(marker)
+    if pos < 0:
+        return None
+    pos = buffer.find(':', pos + len(marker))
+    if pos < 0:
+        return None
+    pos += 1
+    while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+        pos += 1
+    if pos >= len(buffer) or buffer[pos] != '"':
+        return None
+
+    start = pos + 1
+    end = start
+    while end < len(buffer):
+        ch = buffer[end]
+        if ch == '"':
+            break
+        if ch == '\\':
+            if end + 1 >= len(buffer):
+                break
+            step = 6 if buffer[end + 1] == 'u' else 2
+            if end + step > len(buffer):
+                break
+            end += step
+            continue
+        end += 1
+    try:
+        return json.loads(f'"{buffer[start:end]}"')
+    except ValueError:
+        return None
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, 'content', None)
+    if isinstance(content, str) and content:
+        return content
+    # structured output via tool calling: o JSON chega nos argumentos da tool
+    parts = [tc.get('args') or '' for tc in (getattr(chunk, 'tool_call_chunks', None) or [])]
+    return ''.join(p for p in parts if isinstance(p, str))
+
+
+async def stream_generation(request: GenerateRequest, supabase: AsyncClient) -> AsyncIterator[dict]:
+    """Mesmo pipeline de `run_generation`, emitindo eventos de progresso.
+
+    Eventos: status, node_start, node_end (com duração), token (deltas do
+    `resumo_fatos` do Writer), draft (rascunho ao fim do Writer/Editor/Validator/Reviser),
+    result (GenerateResponse) ou error.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    generations_in_flight.inc()
+    try:
+        async for item in _stream_generation(request, supabase):
+            yield item
+        outcome = "ok"
+    finally:
+        # também quando o cliente desconecta no meio (aclose do gerador)
+        generations_in_flight.dec()
+        generation_duration.observe(time.perf_counter() - started, mode="stream", outcome=outcome)
+
+
+async def _stream_generation(request: GenerateRequest, supabase: AsyncClient) -> AsyncIterator[dict]:
+    started = time.perf_counter()
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    yield {"event": "status", "data": {"stage": "started", "elapsed_ms": elapsed_ms()}}
+    prepared = await prepare_generation(request, supabase)
+    yield {"event": "status", "data": {"stage": "prepared", "elapsed_ms": elapsed_ms()}}
+
+    node_started = {}
+    buffers = {}
+    sent = {}
+    final_state = None
+
+    async for ev in app_graph.astream_events(prepared["graph_input"], version="v2"):
+        kind = ev["event"]
+        name = ev.get("name")
+        node = (ev.get("metadata") or {}).get("langgraph_node")
+        run_id = ev.get("run_id")
+
+        if kind == "on_chain_start" and name in GRAPH_NODES and node == name:
+            node_started[run_id] = time.perf_counter()
+            yield {"event": "node_start", "data": {"node": name, "elapsed_ms": elapsed_ms()}}
+
+        elif kind == "on_chain_end" and run_id in node_started:
+            duration = (time.perf_counter() - node_started.pop(run_id)) * 1000
+            yield {"event": "node_end", "data": {"node": name, "duration_ms": round(duration, 1), "elapsed_ms": elapsed_ms()}}
+            draft = ((ev.get("data") or {}).get("output") or {})
+            draft = draft.get("draft") if isinstance(draft, dict) else None
+            if draft is not None and name in ('writer', 'editor', 'validator', 'reviser'):
+                yield {"event": "draft", "data": {"node": name, STREAM_FIELD: getattr(draft, STREAM_FIELD, None)}}
+
+        elif kind == "on_chat_model_stream" and node == "writer":
+            buffers[run_id] = buffers.get(run_id, '') + _chunk_text(ev["data"]["chunk"])
+            value = partial_json_string(buffers[run_id], STREAM_FIELD)
+            if value is not None and len(value) > sent.get(run_id, 0):
+                yield {"event": "token", "data": {"node": node, "field": STREAM_FIELD, "delta": value[sent.get(run_id, 0):]}}
+                sent[run_id] = len(value)
+
+        elif kind == "on_chain_end" and not ev.get("parent_ids"):
+            final_state = (ev.get("data") or {}).get("output")
+
+    response = build_response(final_state or {}, prepared["context"])
+    yield {"event": "result", "data": response.model_dump(mode="json")}
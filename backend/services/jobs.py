@@ -0,0 +1,381 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set
+
+from models.schemas import GenerateRequest
+from services.database import get_supabase
+from services.executor import run_blocking
+from services.generation import stream_generation
+from services.tracing import export_trace, trace_context
+
+# Fila de geração em processo: o cliente envia o pedido, recebe um id e consulta
+# o status (ou assina os eventos) sem segurar a conexão durante o pipeline todo.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_QUEUE_MAX = int(os.getenv('JOB_QUEUE_MAX', '100'))
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '3600'))
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join('data', 'jobs.sqlite3'))
+JOB_PURGE_INTERVAL = float(os.getenv('JOB_PURGE_INTERVAL', '60'))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobStore(ABC):
+    """Persistência dos jobs. Implementações: SQLiteJobStore (local); outra base
+    (ex.: uma tabela no Supabase) só precisa implementar os métodos abstratos."""
+
+    @abstractmethod
+    def create(self, job: dict) -> dict:
+        """Grava o job e o devolve. Se já houver um job válido com o mesmo
+        (user_id, idempotency_key), não grava nada e devolve o existente."""
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        ...
+
+    @abstractmethod
+    def find_by_idempotency_key(self, user_id: str, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def unfinished(self) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def purge_expired(self, now: float) -> int:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+_JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    idempotency_key TEXT,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+# Bases criadas antes do índice único: mantém só o job mais recente de cada chave
+_JOBS_UNIQUE_SQL = """
+DROP INDEX IF EXISTS jobs_idempotency;
+UPDATE jobs SET idempotency_key = NULL
+WHERE idempotency_key IS NOT NULL AND rowid NOT IN (
+    SELECT MAX(rowid) FROM jobs WHERE idempotency_key IS NOT NULL GROUP BY user_id, idempotency_key
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency_unique ON jobs (user_id, idempotency_key);
+"""
+_JSON_FIELDS = ('request', 'result')
+
+
+class SQLiteJobStore(JobStore):
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_JOBS_SQL)
+            conn.executescript(_JOBS_UNIQUE_SQL)
+            self._conn = conn
+        return self._conn
+
+    def _row(self, row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        for f in _JSON_FIELDS:
+            if job.get(f) is not None:
+                job[f] = json.loads(job[f])
+        return job
+
+    def create(self, job: dict) -> dict:
+        data = {k: (json.dumps(v, ensure_ascii=False) if k in _JSON_FIELDS and v is not None else v)
+                for k, v in job.items()}
+        cols = ', '.join(data)
+        marks = ', '.join('?' for _ in data)
+        key = (job.get('user_id'), job.get('idempotency_key'))
+        with self._lock:
+            conn = self._connect()
+            if key[1] is not None:
+                # job expirado (ainda não purgado) libera a chave
+                conn.execute('DELETE FROM jobs WHERE user_id IS ? AND idempotency_key = ? '
+                             'AND expires_at IS NOT NULL AND expires_at <= ?', (*key, time.time()))
+            cur = conn.execute(f'INSERT INTO jobs ({cols}) VALUES ({marks}) ON CONFLICT DO NOTHING',
+                               tuple(data.values()))
+            conn.commit()
+            if cur.rowcount:
+                return job
+            row = conn.execute('SELECT * FROM jobs WHERE user_id IS ? AND idempotency_key = ?', key).fetchone()
+        return self._row(row)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row(row)
+
+    def update(self, job_id: str, **fields) -> None:
+        data = {k: (json.dumps(v, ensure_ascii=False) if k in _JSON_FIELDS and v is not None else v)
+                for k, v in fields.items()}
+        sets = ', '.join(f'{k} = ?' for k in data)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f'UPDATE jobs SET {sets} WHERE id = ?', (*data.values(), job_id))
+            conn.commit()
+
+    def find_by_idempotency_key(self, user_id: str, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT * FROM jobs WHERE user_id = ? AND idempotency_key = ? '
+                'ORDER BY created_at DESC LIMIT 1', (user_id, key)
+            ).fetchone()
+        return self._row(row)
+
+    def unfinished(self) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at', (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute('DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+            conn.commit()
+            return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobQueue:
+    """Pool de workers asyncio sobre um JobStore.
+
+    A concorrência (`workers`) limita quantas gerações rodam ao mesmo tempo;
+    os demais pedidos esperam na fila. Resultados ficam `ttl` segundos no
+    store. Jobs não concluídos são reenfileirados no `start()`.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_MAX,
+                 ttl: float = JOB_RESULT_TTL):
+        self.store = store
+        self.workers = workers
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._queue: Optional[asyncio.Queue] = None
+        # jobs com vaga reservada na fila cujo registro ainda está sendo gravado
+        self._creating: Dict[str, asyncio.Event] = {}
+        # (user_id, Idempotency-Key) -> submit em andamento
+        self._submitting: Dict[tuple, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self):
+        if self._tasks:
+            return
+        unfinished = await run_blocking(self.store.unfinished)
+        # os pendentes de antes do reinício sempre cabem, mesmo acima de maxsize
+        self._queue = asyncio.Queue(max(self.maxsize, len(unfinished)))
+        for job in unfinished:
+            if job['status'] == RUNNING:
+                await run_blocking(self.store.update, job['id'], status=QUEUED, started_at=None)
+            self._queue.put_nowait(job['id'])
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        print(f"🧵 [Jobs] {self.workers} workers iniciados ({self._queue.qsize()} jobs pendentes).")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    # --- API ---
+
+    async def submit(self, request: GenerateRequest, user_id: Optional[str] = None,
+                     idempotency_key: Optional[str] = None) -> dict:
+        """Cria o job (ou devolve o existente para a mesma Idempotency-Key do usuário)."""
+        if not idempotency_key:
+            return await self._submit(request, user_id, None)
+        # reenvios simultâneos neste processo aguardam o primeiro (sem reservar outra vaga);
+        # entre processos, o índice único do store devolve o job já gravado
+        key = (user_id, idempotency_key)
+        inflight = self._submitting.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        task = asyncio.ensure_future(self._submit(request, user_id, idempotency_key))
+        self._submitting[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._submitting.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self._submitting.pop(key, None))
+
+    async def _submit(self, request: GenerateRequest, user_id: Optional[str], idempotency_key: Optional[str]) -> dict:
+        if idempotency_key:
+            existing = await run_blocking(self.store.find_by_idempotency_key, user_id, idempotency_key)
+            if existing and not self._expired(existing):
+                return existing
+        if self._queue is None:
+            raise RuntimeError('Fila de jobs não iniciada')
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'idempotency_key': idempotency_key,
+            'status': QUEUED,
+            'request': request.model_dump(mode='json'),
+            'created_at': time.time(),
+        }
+        # reserva a vaga antes do await: submits concorrentes não passam do limite
+        try:
+            self._queue.put_nowait(job['id'])
+        except asyncio.QueueFull:
+            raise QueueFullError(f'Fila cheia ({self.maxsize} jobs aguardando)')
+        ready = self._creating[job['id']] = asyncio.Event()
+        try:
+            # mesma Idempotency-Key gravada por um submit concorrente: devolve aquele job
+            # (a vaga reservada fica com um id sem registro, que o worker descarta)
+            return await run_blocking(self.store.create, job)
+        finally:
+            ready.set()
+            self._creating.pop(job['id'], None)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await run_blocking(self.store.get, job_id)
+        if job is None or self._expired(job):
+            return None
+        return job
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subs = self._subscribers.get(job_id)
+        if subs:
+            subs.discard(queue)
+            if not subs:
+                self._subscribers.pop(job_id, None)
+
+    # --- internos ---
+
+    def _expired(self, job: dict) -> bool:
+        return bool(job.get('expires_at')) and job['expires_at'] <= time.time()
+
+    def _publish(self, job_id: str, event: str, data):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait({'event': event, 'data': data})
+
+    async def _worker(self, n: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ [Jobs] Worker {n} falhou no job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        ready = self._creating.get(job_id)
+        if ready is not None:
+            await ready.wait()
+        job = await run_blocking(self.store.get, job_id)
+        if job is None or job['status'] != QUEUED:
+            return
+        await run_blocking(self.store.update, job_id, status=RUNNING, started_at=time.time())
+        self._publish(job_id, 'status', {'status': RUNNING})
+        print(f"🧵 [Jobs] Executando job {job_id}")
+
+        result, error = None, None
+        # trace do job com o id do job (GET /api/debug/traces/{job_id})
+        ctx = trace_context(job_id, 'job generate', job_id=job_id)
+        try:
+            with ctx:
+                request = GenerateRequest.model_validate(job['request'])
+                supabase = await get_supabase()
+                async for item in stream_generation(request, supabase):
+                    if item['event'] == 'result':
+                        result = item['data']
+                    else:
+                        self._publish(job_id, item['event'], item['data'])
+        except asyncio.CancelledError:
+            # desligamento: volta para a fila e é retomado no próximo start()
+            await run_blocking(self.store.update, job_id, status=QUEUED, started_at=None)
+            raise
+        except Exception as e:
+            print(f"❌ [Jobs] Erro no job {job_id}: {e}")
+            error = f"Erro interno ao gerar documento: {str(e)}"
+
+        await export_trace(ctx.trace)
+
+        finished = time.time()
+        status = SUCCEEDED if error is None else FAILED
+        await run_blocking(
+            self.store.update, job_id,
+            status=status, result=result, error=error,
+            finished_at=finished, expires_at=finished + self.ttl
+        )
+        if error is None:
+            self._publish(job_id, 'result', result)
+        else:
+            self._publish(job_id, 'error', {'detail': error})
+        self._publish(job_id, 'status', {'status': status})
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(JOB_PURGE_INTERVAL)
+            try:
+                removed = await run_blocking(self.store.purge_expired, time.time())
+                if removed:
+                    print(f"🧹 [Jobs] {removed} jobs expirados removidos.")
+            except Exception as e:
+                print(f"❌ [Jobs] Erro ao limpar jobs expirados: {e}")
+
+
+# Instância compartilhada (iniciada no lifespan do main.py)
+job_queue = JobQueue(SQLiteJobStore())
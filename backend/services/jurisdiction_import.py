@@ -0,0 +1,299 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from services.jurisdiction_index import fetch_all
+from services.text import fold
+
+# Tamanho dos lotes de escrita e dos filtros `in.(...)` (limita o tamanho da URL)
+WRITE_CHUNK = int(os.getenv('JURISDICTION_IMPORT_CHUNK', '500'))
+IN_CHUNK = 200
+DIFF_SAMPLE_LIMIT = int(os.getenv('JURISDICTION_DIFF_SAMPLE_LIMIT', '1000'))
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_row(row: dict) -> Optional[dict]:
+    """Normaliza uma linha do CSV/XLSX; None se faltar algum campo obrigatório."""
+    section_name = str(row.get('section') or row.get('Seção') or '').strip()
+    subsection_name = str(row.get('subsection') or row.get('Subseção') or '').strip()
+    municipality_name = str(row.get('municipality') or row.get('Município') or '').strip()
+    state = str(row.get('state') or row.get('UF') or '').strip().upper()
+    legal_basis = str(row.get('legal_basis') or row.get('legal') or row.get('Base legal') or '').strip()
+
+    if not section_name or not subsection_name or not municipality_name or not state:
+        return None
+    return {
+        'section': section_name,
+        'subsection': subsection_name,
+        'municipality': municipality_name,
+        'state': state,
+        'legal_basis': legal_basis,
+    }
+
+
+class JurisdictionImporter:
+    """Importação em estágios: parse -> dedupe em memória -> busca em lote das chaves
+    existentes -> diff -> escrita em lote por tabela.
+
+    `process()` pode ser chamado várias vezes (um lote de linhas por vez); seções e
+    subseções já conhecidas ficam em memória entre lotes. Com `dry_run=True` nada é
+    escrito e o resultado traz o diff (novos, alterados e inalterados); o que um lote
+    anterior criaria/alteraria vale como estado atual para os lotes seguintes, como na
+    importação real. Linhas cuja escrita falhou contam como `failed`, não como novas
+    ou alteradas.
+    """
+
+    def __init__(self, supabase, dry_run: bool = False):
+        self.supabase = supabase
+        self.dry_run = dry_run
+        self.inserted = {'sections': 0, 'subsections': 0, 'municipalities': 0, 'maps': 0, 'updated_maps': 0}
+        self.diff = {'new': [], 'changed': [], 'unchanged': [], 'failed': []}
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+        # dry run: chaves que seriam criadas (conjuntos para não contar duas vezes entre lotes)
+        self._planned = {'sections': set(), 'subsections': set(), 'municipalities': set()}
+        # dry run: (UF, município) -> mapeamento que os lotes anteriores gravariam
+        self._planned_maps: Dict[Tuple[str, str], dict] = {}
+        self.skipped_rows: List[int] = []
+        self.errors: List[dict] = []
+        # caches entre lotes
+        self._sections: Optional[Dict[str, dict]] = None
+        self._subsections: Dict[Tuple[str, str], dict] = {}
+        self._subsection_names: Dict[str, str] = {}
+        self._loaded_section_ids = set()
+
+    # --- estágio 1/2: parse + dedupe ---
+
+    def _dedupe(self, rows: List[Tuple[int, dict]]) -> List[dict]:
+        records: Dict[Tuple[str, str], dict] = {}
+        for line, row in rows:
+            record = parse_row(row)
+            if not record:
+                self.skipped_rows.append(line)
+                continue
+            record['line'] = line
+            # a última linha de um mesmo município prevalece (mesma semântica do import linha a linha)
+            key = (record['state'], fold(record['municipality']))
+            records.pop(key, None)
+            records[key] = record
+        return list(records.values())
+
+    # --- estágio 3: busca em lote do que já existe ---
+
+    async def _load_sections(self):
+        if self._sections is None:
+            rows = await fetch_all(lambda: self.supabase.table('judicial_sections').select('id, name').order('id'))
+            self._sections = {}
+            for s in rows:
+                self._sections.setdefault(fold(s['name']), s)
+
+    async def _load_subsections(self, section_ids: List[str]):
+        missing = [sid for sid in section_ids if sid not in self._loaded_section_ids]
+        for part in _chunks(missing, IN_CHUNK):
+            rows = await fetch_all(lambda: self.supabase.table('judicial_subsections')
+                                   .select('id, name, section_id').in_('section_id', part).order('id'))
+            for s in rows:
+                self._subsections.setdefault((s['section_id'], fold(s['name'])), s)
+                self._subsection_names[s['id']] = s['name']
+            self._loaded_section_ids.update(part)
+
+    async def _load_municipalities(self, records: List[dict]) -> Dict[Tuple[str, str], dict]:
+        wanted = {(r['state'], fold(r['municipality'])) for r in records}
+        states = sorted({state for state, _ in wanted})
+        found: Dict[Tuple[str, str], dict] = {}
+        rows = await fetch_all(lambda: self.supabase.table('municipalities')
+                               .select('id, name, state').in_('state', states).order('id'))
+        for m in rows:
+            key = ((m.get('state') or '').upper(), fold(m['name']))
+            if key in wanted:
+                found.setdefault(key, m)
+        return found
+
+    async def _load_maps(self, municipality_ids: List[str]) -> Dict[str, dict]:
+        maps: Dict[str, dict] = {}
+        for part in _chunks(municipality_ids, IN_CHUNK):
+            rows = await fetch_all(lambda: self.supabase.table('jurisdiction_map')
+                                   .select('id, municipality_id, subsection_id, legal_basis')
+                                   .in_('municipality_id', part).order('id'))
+            for m in rows:
+                maps.setdefault(m['municipality_id'], m)
+        return maps
+
+    # --- estágio 5: escrita em lote ---
+
+    async def _insert(self, table: str, payloads: List[dict], failed: Optional[set] = None) -> List[dict]:
+        """Insere em lotes; índices (em `payloads`) dos lotes que falharam vão para `failed`."""
+        created = []
+        for start in range(0, len(payloads), WRITE_CHUNK):
+            part = payloads[start:start + WRITE_CHUNK]
+            try:
+                res = await self.supabase.table(table).insert(part).execute()
+                created.extend(getattr(res, 'data', None) or [])
+            except Exception as e:
+                self.errors.append({'table': table, 'count': len(part), 'error': str(e)})
+                if failed is not None:
+                    failed.update(range(start, start + len(part)))
+        return created
+
+    async def _upsert_maps(self, payloads: List[dict], failed: Optional[set] = None) -> int:
+        updated = 0
+        for start in range(0, len(payloads), WRITE_CHUNK):
+            part = payloads[start:start + WRITE_CHUNK]
+            try:
+                await self.supabase.table('jurisdiction_map').upsert(part, on_conflict='id').execute()
+                updated += len(part)
+            except Exception as e:
+                self.errors.append({'table': 'jurisdiction_map', 'count': len(part), 'error': str(e)})
+                if failed is not None:
+                    failed.update(range(start, start + len(part)))
+        return updated
+
+    async def _ensure_sections(self, records: List[dict]):
+        await self._load_sections()
+        new = {}
+        for r in records:
+            key = fold(r['section'])
+            if key not in self._sections and key not in new:
+                new[key] = {'name': r['section'], 'code': r['section'][:6].upper(), 'trf': ''}
+        if self.dry_run:
+            self._planned['sections'].update(new)
+        elif new:
+            for s in await self._insert('judicial_sections', list(new.values())):
+                self._sections.setdefault(fold(s['name']), s)
+                self.inserted['sections'] += 1
+        return new
+
+    async def _ensure_subsections(self, records: List[dict]):
+        section_ids = sorted({self._sections[fold(r['section'])]['id']
+                              for r in records if fold(r['section']) in self._sections})
+        await self._load_subsections(section_ids)
+        new = {}
+        for r in records:
+            section = self._sections.get(fold(r['section']))
+            if not section:
+                if self.dry_run:
+                    self._planned['subsections'].add((fold(r['section']), fold(r['subsection'])))
+                continue
+            key = (section['id'], fold(r['subsection']))
+            if key not in self._subsections and key not in new:
+                new[key] = {'section_id': section['id'], 'name': r['subsection'], 'city': r['subsection'], 'has_jef': True}
+        if self.dry_run:
+            self._planned['subsections'].update(new)
+        elif new:
+            for s in await self._insert('judicial_subsections', list(new.values())):
+                self._subsections.setdefault((s['section_id'], fold(s['name'])), s)
+                self._subsection_names[s['id']] = s['name']
+                self.inserted['subsections'] += 1
+        return new
+
+    def _record_diff(self, kind: str, entry: dict):
+        self.counts[kind] += 1
+        if len(self.diff[kind]) < DIFF_SAMPLE_LIMIT:
+            self.diff[kind].append(entry)
+
+    async def process(self, rows: List[Tuple[int, dict]]):
+        """Processa um lote de (número da linha, linha bruta)."""
+        records = self._dedupe(rows)
+        if not records:
+            return
+
+        await self._ensure_sections(records)
+        await self._ensure_subsections(records)
+
+        municipalities = await self._load_municipalities(records)
+        new_municipalities = {}
+        for r in records:
+            key = (r['state'], fold(r['municipality']))
+            if key not in municipalities and key not in new_municipalities:
+                new_municipalities[key] = {'name': r['municipality'], 'state': r['state']}
+        if self.dry_run:
+            self._planned['municipalities'].update(new_municipalities)
+        elif new_municipalities:
+            for m in await self._insert('municipalities', list(new_municipalities.values())):
+                municipalities.setdefault(((m.get('state') or '').upper(), fold(m['name'])), m)
+                self.inserted['municipalities'] += 1
+
+        existing_maps = await self._load_maps(sorted({m['id'] for m in municipalities.values()}))
+
+        # (tipo, entrada do diff, índice em map_inserts/map_updates ou None se não há o que gravar)
+        pending: List[Tuple[str, dict, Optional[int]]] = []
+        map_inserts, map_updates = [], []
+        for r in records:
+            entry = {k: r[k] for k in ('line', 'section', 'subsection', 'municipality', 'state', 'legal_basis')}
+            key = (r['state'], fold(r['municipality']))
+            if self.dry_run and key in self._planned_maps:
+                # já criado/alterado por um lote anterior deste mesmo dry run
+                planned = self._planned_maps[key]
+                self._planned_maps[key] = entry
+                if (fold(planned['section']), fold(planned['subsection']), planned['legal_basis']) == \
+                        (fold(r['section']), fold(r['subsection']), r['legal_basis']):
+                    pending.append(('unchanged', entry, None))
+                else:
+                    entry['before'] = {'subsection': planned['subsection'], 'legal_basis': planned['legal_basis']}
+                    pending.append(('changed', entry, None))
+                continue
+
+            section = self._sections.get(fold(r['section']))
+            subsection = self._subsections.get((section['id'], fold(r['subsection']))) if section else None
+            municipality = municipalities.get(key)
+            current = existing_maps.get(municipality['id']) if municipality else None
+
+            if not current:
+                index = None
+                if subsection and municipality:
+                    index = len(map_inserts)
+                    map_inserts.append({'municipality_id': municipality['id'], 'subsection_id': subsection['id'],
+                                        'legal_basis': r['legal_basis']})
+                pending.append(('new', entry, index))
+                continue
+
+            same_subsection = subsection is not None and current.get('subsection_id') == subsection['id']
+            if same_subsection and (current.get('legal_basis') or '') == r['legal_basis']:
+                pending.append(('unchanged', entry, None))
+                continue
+
+            entry['before'] = {
+                'subsection': self._subsection_names.get(current.get('subsection_id'), current.get('subsection_id')),
+                'legal_basis': current.get('legal_basis'),
+            }
+            index = None
+            if subsection:
+                index = len(map_updates)
+                map_updates.append({'id': current['id'], 'municipality_id': municipality['id'],
+                                    'subsection_id': subsection['id'], 'legal_basis': r['legal_basis']})
+            pending.append(('changed', entry, index))
+
+        if self.dry_run:
+            for kind, entry, _ in pending:
+                self._record_diff(kind, entry)
+                if kind != 'unchanged':
+                    self._planned_maps[(entry['state'], fold(entry['municipality']))] = entry
+            return
+
+        failed = {'new': set(), 'changed': set()}
+        if map_inserts:
+            self.inserted['maps'] += len(await self._insert('jurisdiction_map', map_inserts, failed['new']))
+        if map_updates:
+            self.inserted['updated_maps'] += await self._upsert_maps(map_updates, failed['changed'])
+        for kind, entry, index in pending:
+            # sem o que gravar (seção/subseção/município não criados) ou lote com erro: não foi importada
+            if kind != 'unchanged' and (index is None or index in failed[kind]):
+                kind = 'failed'
+            self._record_diff(kind, entry)
+
+    def result(self) -> dict:
+        out = {
+            'status': 'ok',
+            'dry_run': self.dry_run,
+            'summary': dict(self.counts),
+            'diff': self.diff,
+            'skipped_rows': self.skipped_rows,
+        }
+        if self.dry_run:
+            out['to_create'] = {table: len(keys) for table, keys in self._planned.items()}
+        else:
+            out['inserted'] = self.inserted
+            out['errors'] = self.errors
+        return out
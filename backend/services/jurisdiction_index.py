@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.text import fold
+
+PAGE_SIZE = 1000
+VERSION_TABLES = ('judicial_sections', 'judicial_subsections', 'municipalities', 'jurisdiction_map')
+MAP_SELECT = 'municipality_id, legal_basis, subsection:subsection_id(name,city,has_jef, judicial_sections(name))'
+# Versão das tabelas = contagem + maior valor desta coluna (mantida por trigger no banco,
+# ex.: moddatetime), para que UPDATEs também forcem recarga. Sem a coluna, só a contagem
+# vale e a recarga por idade (INDEX_MAX_AGE_SECONDS) garante que edições apareçam.
+INDEX_VERSION_COLUMN = os.getenv('INDEX_VERSION_COLUMN', 'updated_at')
+INDEX_MAX_AGE = float(os.getenv('INDEX_MAX_AGE_SECONDS', '900'))
+# tabelas em que a coluna de versão não existe (descoberto na primeira leitura)
+_without_version_column = set()
+
+
+async def fetch_all(build_query, page_size: int = PAGE_SIZE) -> list:
+    """Pagina um select do PostgREST (limite padrão de 1000 linhas por resposta)."""
+    rows = []
+    start = 0
+    while True:
+        res = await build_query().range(start, start + page_size - 1).execute()
+        page = getattr(res, 'data', None) or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+async def table_version(supabase, table: str) -> tuple:
+    """(contagem de linhas, maior INDEX_VERSION_COLUMN) da tabela: muda em INSERT, DELETE e UPDATE."""
+    count = supabase.table(table).select('id', count='exact').limit(1).execute()
+    if not INDEX_VERSION_COLUMN or table in _without_version_column:
+        return (getattr(await count, 'count', None), None)
+    latest = supabase.table(table).select(INDEX_VERSION_COLUMN) \
+        .order(INDEX_VERSION_COLUMN, desc=True, nullsfirst=False).limit(1).execute()
+    res, latest_res = await asyncio.gather(count, latest, return_exceptions=True)
+    if isinstance(res, BaseException):
+        raise res
+    if isinstance(latest_res, BaseException):
+        # 42703 = coluna inexistente: não tenta de novo; outros erros valem só para esta verificação
+        if '42703' in str(latest_res) or 'does not exist' in str(latest_res):
+            _without_version_column.add(table)
+            print(f"⚠️ [Index] '{table}' sem a coluna '{INDEX_VERSION_COLUMN}': versão só pela contagem")
+        return (getattr(res, 'count', None), None)
+    rows = getattr(latest_res, 'data', None) or []
+    return (getattr(res, 'count', None), rows[0].get(INDEX_VERSION_COLUMN) if rows else None)
+
+
+class JurisdictionIndex:
+    """Índice em memória (UF, município) -> subseção/seção/base legal já resolvidos.
+
+    Carregado uma única vez por processo e recarregado quando a versão das
+    tabelas de competência muda (contagem + `updated_at`, ver `table_version`),
+    quando a carga passa de `max_age` segundos ou após `invalidate()`.
+    """
+
+    def __init__(self, client_factory: Callable[[], Awaitable], check_interval: Optional[float] = None,
+                 max_age: float = INDEX_MAX_AGE):
+        self._client_factory = client_factory
+        self.check_interval = check_interval if check_interval is not None else \
+            float(os.getenv('JURISDICTION_INDEX_CHECK_SECONDS', '60'))
+        self.max_age = max_age
+        # (UF, município normalizado) -> registro (None se o município não tiver mapeamento)
+        self._exact: Dict[Tuple[str, str], Optional[dict]] = {}
+        # UF -> [(município normalizado, registro)] na ordem do banco, para o match parcial
+        self._by_state: Dict[str, List[Tuple[str, Optional[dict]]]] = {}
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def invalidate(self):
+        """Força verificação de versão/recarga na próxima consulta."""
+        self._loaded = False
+        self._checked_at = 0.0
+
+    async def _read_version(self, supabase) -> tuple:
+        return tuple(await asyncio.gather(*[table_version(supabase, table) for table in VERSION_TABLES]))
+
+    async def _load(self, supabase, version: tuple):
+        municipalities, maps = await asyncio.gather(
+            fetch_all(lambda: supabase.table('municipalities').select('id, name, state').order('id')),
+            fetch_all(lambda: supabase.table('jurisdiction_map').select(MAP_SELECT).order('id')),
+        )
+
+        by_municipality = {}
+        for row in maps:
+            mun_id = row.get('municipality_id')
+            if mun_id in by_municipality:
+                continue
+            subsection = row.get('subsection') or {}
+            section_data = subsection.get('judicial_sections') or {}
+            by_municipality[mun_id] = {
+                'subsecao': subsection.get('name'),
+                'city': subsection.get('city'),
+                'has_jef': subsection.get('has_jef'),
+                'section': section_data.get('name') if isinstance(section_data, dict) else None,
+                'legal_basis': row.get('legal_basis'),
+            }
+
+        exact: Dict[Tuple[str, str], Optional[dict]] = {}
+        by_state: Dict[str, List[Tuple[str, Optional[dict]]]] = {}
+        for m in municipalities:
+            state = (m.get('state') or '').strip().upper()
+            key = fold(m.get('name'))
+            if not state or not key:
+                continue
+            record = None
+            joined = by_municipality.get(m.get('id'))
+            if joined:
+                record = {'found': True, 'municipio': m.get('name'), 'state': state, **joined}
+            by_state.setdefault(state, []).append((key, record))
+            exact.setdefault((state, key), record)
+
+        self._exact = exact
+        self._by_state = by_state
+        self._version = version
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+        print(f"🗺️ [Jurisdiction] Índice carregado: {len(exact)} municípios, {len(by_municipality)} mapeamentos.")
+
+    async def ensure_fresh(self):
+        if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            supabase = await self._client_factory()
+            version = await self._read_version(supabase)
+            expired = self.max_age and time.monotonic() - self._loaded_at >= self.max_age
+            if not self._loaded or version != self._version or expired:
+                await self._load(supabase, version)
+            self._checked_at = time.monotonic()
+
+    def resolve(self, municipality: str, state: str) -> dict:
+        """Lookup puramente local: match exato normalizado, depois match por contenção."""
+        state_upper = (state or '').strip().upper()
+        key = fold(municipality)
+        if not key or not state_upper:
+            return {'found': False}
+
+        if (state_upper, key) in self._exact:
+            record = self._exact[(state_upper, key)]
+            return dict(record) if record else {'found': False}
+
+        for name, record in self._by_state.get(state_upper, ()):
+            if name in key or key in name:
+                return dict(record) if record else {'found': False}
+
+        return {'found': False}
+
+    async def lookup(self, municipality: str, state: str) -> dict:
+        await self.ensure_fresh()
+        return self.resolve(municipality, state)
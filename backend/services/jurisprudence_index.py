@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.executor import run_blocking
+from services.jurisdiction_index import PAGE_SIZE, INDEX_MAX_AGE, table_version
+from services.rerank import SemanticReranker
+from services.text import tokenize
+
+# Pesos por campo (BM25F simplificado: tf ponderado antes da saturação)
+FIELD_WEIGHTS = {'title': 3.0, 'summary': 2.0, 'citation': 1.0, 'full_text': 1.0}
+INDEX_SELECT = 'id, title, citation, court, summary, full_text, tags, source_url'
+# Metadados mantidos em memória (full_text só é usado para indexar)
+DOC_FIELDS = ('id', 'title', 'citation', 'court', 'summary', 'tags', 'source_url')
+
+
+def _analyze(row: dict) -> Tuple[dict, Dict[str, float], float]:
+    tf: Dict[str, float] = {}
+    for fname, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(row.get(fname) or ''):
+            tf[term] = tf.get(term, 0.0) + weight
+    doc = {f: row.get(f) for f in DOC_FIELDS}
+    return doc, tf, sum(tf.values())
+
+
+def _analyze_page(rows: list) -> list:
+    return [_analyze(r) for r in rows]
+
+
+class JurisprudenceIndex:
+    """Índice invertido BM25 em memória sobre a tabela `jurisprudences`.
+
+    Termos passam por `services.text.tokenize` (sem acentos, stopwords e stemming
+    leve em português). Recarregado quando a versão da tabela muda (contagem +
+    `updated_at`, ver `table_version`), quando a carga passa de `max_age` segundos
+    ou após `invalidate()`; cada consulta é local e retorna o top-k por relevância.
+    Na mesma carga mantém `vectors` (TF-IDF NumPy) para re-ranking semântico.
+    """
+
+    def __init__(self, client_factory: Callable[[], Awaitable], check_interval: Optional[float] = None,
+                 k1: float = 1.2, b: float = 0.75, max_age: float = INDEX_MAX_AGE):
+        self._client_factory = client_factory
+        self.check_interval = check_interval if check_interval is not None else \
+            float(os.getenv('JURISPRUDENCE_INDEX_CHECK_SECONDS', '60'))
+        self.max_age = max_age
+        self.k1 = k1
+        self.b = b
+        self.docs: List[dict] = []
+        # termo -> (ids dos documentos, peso BM25 de tf já saturado pelo tamanho do doc)
+        self._postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._by_id: Dict[str, dict] = {}
+        self.vectors = SemanticReranker()
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._loaded = False
+        self._checked_at = 0.0
+
+    async def _read_version(self, supabase):
+        return await table_version(supabase, 'jurisprudences')
+
+    async def _load(self, supabase, version):
+        docs, doc_tfs, lengths = [], [], []
+        start = 0
+        revectorized = 0
+        self.vectors.begin_sync()
+        if version and isinstance(version[0], int):
+            self.vectors.reserve(version[0])
+        while True:
+            res = await supabase.table('jurisprudences').select(INDEX_SELECT).order('id') \
+                .range(start, start + PAGE_SIZE - 1).execute()
+            page = getattr(res, 'data', None) or []
+            # tokenização é CPU: roda fora do event loop, uma página por vez
+            for doc, tf, length in await run_blocking(_analyze_page, page):
+                docs.append(doc)
+                doc_tfs.append(tf)
+                lengths.append(length)
+            # só linhas novas/alteradas são re-vetorizadas
+            revectorized += self.vectors.apply(await run_blocking(self.vectors.prepare, page))
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        postings, idf = await run_blocking(self._build, doc_tfs, lengths)
+        removed = self.vectors.end_sync()
+        self.docs = docs
+        self._by_id = {doc['id']: doc for doc in docs}
+        self._postings = postings
+        self._idf = idf
+        self._version = version
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+        print(f"📚 [Jurisprudence] Índice BM25 carregado: {len(docs)} documentos, {len(postings)} termos "
+              f"(vetores: {revectorized} novos/alterados, {removed} removidos).")
+
+    def _build(self, doc_tfs: List[Dict[str, float]], lengths: List[float]):
+        n = len(doc_tfs)
+        avgdl = (sum(lengths) / n) if n else 0.0
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc_id, tf in enumerate(doc_tfs):
+            norm = self.k1 * (1 - self.b + self.b * (lengths[doc_id] / avgdl if avgdl else 0))
+            for term, freq in tf.items():
+                ids, weights = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                weights.append(freq * (self.k1 + 1) / (freq + norm))
+        idf = {
+            term: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in postings.items()
+        }
+        return postings, idf
+
+    async def ensure_fresh(self):
+        if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            supabase = await self._client_factory()
+            version = await self._read_version(supabase)
+            expired = self.max_age and time.monotonic() - self._loaded_at >= self.max_age
+            if not self._loaded or version != self._version or expired:
+                await self._load(supabase, version)
+            self._checked_at = time.monotonic()
+
+    def search(self, query: str, k: int = 3, court: Optional[str] = None,
+               tags: Optional[List[str]] = None) -> List[Tuple[float, dict]]:
+        """Top-k (score, documento) por BM25; filtros opcionais de tribunal e tags (todas)."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = self._idf[term]
+            for doc_id, weight in zip(*posting):
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+
+        if court or tags:
+            wanted = set(tags or [])
+
+            def keep(doc):
+                if court and doc.get('court') != court:
+                    return False
+                return wanted <= set(doc.get('tags') or [])
+
+            scores = {d: s for d, s in scores.items() if keep(self.docs[d])}
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.docs[doc_id]) for doc_id, score in best]
+
+    def get(self, doc_id) -> Optional[dict]:
+        return self._by_id.get(doc_id)
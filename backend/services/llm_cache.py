@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple, Type
+
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict
+from pydantic import BaseModel
+
+from services.executor import run_blocking
+
+# Cache persistente das respostas do LLM (temperature=0): mesma chamada, mesma resposta.
+# A chave é o hash de (parâmetros do modelo, mensagens, schema de saída).
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join('data', 'llm_cache.sqlite3'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used);
+"""
+
+
+def _model_params(llm) -> dict:
+    params = {'model': getattr(llm, 'model_name', None) or getattr(llm, 'model', None)}
+    for attr in ('temperature', 'top_p', 'max_tokens', 'seed'):
+        value = getattr(llm, attr, None)
+        if value is not None:
+            params[attr] = value
+    return params
+
+
+def _usage_tokens(message) -> int:
+    usage = getattr(message, 'usage_metadata', None) or {}
+    return int(usage.get('total_tokens') or 0)
+
+
+def _usage(message=None, cached_tokens: int = 0) -> dict:
+    """Uso de uma chamada: tokens reais do modelo ou, em hit, os tokens que foram poupados."""
+    meta = getattr(message, 'usage_metadata', None) or {}
+    return {
+        'calls': 1,
+        'prompt_tokens': int(meta.get('input_tokens') or 0),
+        'completion_tokens': int(meta.get('output_tokens') or 0),
+        'cached_tokens': cached_tokens,
+    }
+
+
+class LLMCache:
+    """Cache SQLite endereçado por conteúdo, com LRU limitado a `max_entries` linhas.
+
+    `invoke`/`ainvoke` envolvem a chamada ao modelo: com `schema`, usa
+    structured output e guarda o objeto validado; sem, guarda o texto da resposta.
+    `bypass=True` ignora a leitura mas grava a resposta nova.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA_SQL)
+            self._count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def key(self, llm, messages: List[BaseMessage], schema: Optional[Type[BaseModel]] = None) -> str:
+        material = {
+            'model': _model_params(llm),
+            'messages': [message_to_dict(m) for m in messages],
+            'schema': schema.model_json_schema() if schema else None,
+        }
+        raw = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    # --- armazenamento ---
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT payload, tokens FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE llm_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+                conn.commit()
+            return row
+
+    def put(self, key: str, model: str, payload: str, tokens: int):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            existed = conn.execute('SELECT 1 FROM llm_cache WHERE key = ?', (key,)).fetchone() is not None
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, model, payload, tokens, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, payload, tokens, now, now)
+            )
+            if not existed:
+                self._count += 1
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?)', (overflow,)
+                )
+                self._count -= overflow
+                self.evictions += overflow
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM llm_cache')
+            conn.commit()
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- chamadas ao modelo ---
+
+    def _decode(self, payload: str, schema: Optional[Type[BaseModel]]):
+        if schema:
+            return schema.model_validate_json(payload)
+        return AIMessage(content=payload)
+
+    def _call(self, llm, messages, schema):
+        if schema:
+            out = llm.with_structured_output(schema, include_raw=True).invoke(messages)
+            if out.get('parsing_error'):
+                raise out['parsing_error']
+            return out['parsed'], out['parsed'].model_dump_json(), out['raw']
+        message = llm.invoke(messages)
+        return message, message.content, message
+
+    async def _acall(self, llm, messages, schema):
+        if schema:
+            out = await llm.with_structured_output(schema, include_raw=True).ainvoke(messages)
+            if out.get('parsing_error'):
+                raise out['parsing_error']
+            return out['parsed'], out['parsed'].model_dump_json(), out['raw']
+        message = await llm.ainvoke(messages)
+        return message, message.content, message
+
+    def _on_hit(self, tokens: int):
+        self.hits += 1
+        self.tokens_saved += tokens
+        print(f"♻️ [LLM CACHE] Resposta reaproveitada ({tokens} tokens economizados).")
+
+    def invoke(self, llm, messages: List[BaseMessage], schema: Optional[Type[BaseModel]] = None,
+               bypass: bool = False) -> Any:
+        if not self.enabled:
+            return self._call(llm, messages, schema)[0]
+        key = self.key(llm, messages, schema)
+        if bypass:
+            self.bypassed += 1
+        else:
+            row = self.get(key)
+            if row is not None:
+                self._on_hit(row[1])
+                return self._decode(row[0], schema)
+            self.misses += 1
+        result, payload, raw = self._call(llm, messages, schema)
+        self.put(key, _model_params(llm)['model'], payload, _usage_tokens(raw))
+        return result
+
+    async def ainvoke(self, llm, messages: List[BaseMessage], schema: Optional[Type[BaseModel]] = None,
+                      bypass: bool = False) -> Any:
+        return (await self.ainvoke_with_usage(llm, messages, schema=schema, bypass=bypass))[0]
+
+    async def ainvoke_with_usage(self, llm, messages: List[BaseMessage], schema: Optional[Type[BaseModel]] = None,
+                                 bypass: bool = False) -> Tuple[Any, dict]:
+        """Como `ainvoke`, devolvendo também o uso de tokens da chamada (ver `_usage`)."""
+        if not self.enabled:
+            result, _, raw = await self._acall(llm, messages, schema)
+            return result, _usage(raw)
+        key = self.key(llm, messages, schema)
+        if bypass:
+            self.bypassed += 1
+        else:
+            row = await run_blocking(self.get, key)
+            if row is not None:
+                self._on_hit(row[1])
+                return self._decode(row[0], schema), _usage(cached_tokens=row[1])
+            self.misses += 1
+        result, payload, raw = await self._acall(llm, messages, schema)
+        await run_blocking(self.put, key, _model_params(llm)['model'], payload, _usage_tokens(raw))
+        return result, _usage(raw)
+
+    def stats(self) -> dict:
+        if self.enabled:
+            with self._lock:
+                self._connect()
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'entries': self._count,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'evictions': self.evictions,
+            'tokens_saved': self.tokens_saved,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Instância compartilhada pelos nós do grafo
+llm_cache = LLMCache()
@@ -0,0 +1,321 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+
+# Métricas no formato texto do Prometheus (exposição em GET /metrics).
+# Implementação mínima e sem dependências: Counter, Gauge e Histogram com labels,
+# mais "collectors" que leem contadores já existentes (caches, tokens) só na coleta.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Segundos; cobre de chamadas ao Supabase (ms) até gerações completas (minutos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{_labels(self.labelnames, k)} {_number(v)}' for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [contagem por bucket (não cumulativa) + overflow, soma]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][idx] += 1
+            state[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(s[0]), s[1]) for k, s in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+# Collector: função chamada na coleta que devolve (nome, tipo, ajuda, [(labels, valor)])
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn: Collector) -> Collector:
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"⚠️ [Metrics] Collector {getattr(collect, '__name__', collect)} falhou: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f'{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# --- Métricas da aplicação ---
+
+http_requests = registry.counter(
+    'http_requests_total', 'Requisições HTTP por rota, método e status.', ('route', 'method', 'status'))
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Latência das requisições HTTP por rota.', ('route', 'method'))
+http_in_flight = registry.gauge('http_requests_in_flight', 'Requisições HTTP em andamento.')
+
+generations_in_flight = registry.gauge('generations_in_flight', 'Gerações de documento em andamento.')
+generation_duration = registry.histogram(
+    'generation_duration_seconds', 'Duração das gerações completas.', ('mode', 'outcome'))
+
+graph_node_duration = registry.histogram(
+    'graph_node_duration_seconds', 'Duração de cada nó do grafo de agentes.', ('node',))
+graph_node_errors = registry.counter('graph_node_errors_total', 'Exceções por nó do grafo.', ('node',))
+llm_call_duration = registry.histogram(
+    'llm_call_duration_seconds', 'Latência das chamadas ao LLM (inclui hits do cache).', ('node',))
+
+supabase_requests = registry.counter(
+    'supabase_requests_total', 'Requisições ao Supabase por tabela, método e status.', ('table', 'method', 'status'))
+supabase_request_duration = registry.histogram(
+    'supabase_request_duration_seconds', 'Latência até os cabeçalhos da resposta do Supabase.', ('table', 'method'))
+
+
+# --- Instrumentação ---
+
+def supabase_table(url) -> str:
+    """/rest/v1/<tabela>?... -> tabela; /rest/v1/rpc/<fn> -> rpc/<fn>; /auth/v1/<x> -> auth/<x>."""
+    parts = [p for p in urlsplit(str(url)).path.split('/') if p]
+    if len(parts) >= 3 and parts[0] == 'rest' and parts[2] == 'rpc' and len(parts) >= 4:
+        return f'rpc/{parts[3]}'
+    if len(parts) >= 3 and parts[0] == 'rest':
+        return parts[2]
+    if len(parts) >= 3 and parts[0] == 'auth':
+        return f'auth/{parts[2]}'
+    return parts[0] if parts else 'unknown'
+
+
+async def _on_supabase_request(request):
+    request.extensions['metrics_started'] = time.perf_counter()
+
+
+async def _on_supabase_response(response):
+    request = response.request
+    started = request.extensions.get('metrics_started')
+    table = supabase_table(request.url)
+    supabase_requests.inc(table=table, method=request.method, status=response.status_code)
+    if started is not None:
+        supabase_request_duration.observe(time.perf_counter() - started, table=table, method=request.method)
+
+
+def supabase_event_hooks() -> dict:
+    """event_hooks do httpx.AsyncClient do Supabase (services/database.py)."""
+    if not METRICS_ENABLED:
+        return {}
+    return {'request': [_on_supabase_request], 'response': [_on_supabase_response]}
+
+
+def timed_node(name: str, fn):
+    """Envolve um nó assíncrono do grafo medindo duração e exceções.
+
+    Cancelamentos (cliente desconectado, timeout do wait_for) não contam como
+    erro nem entram no histograma de duração.
+    """
+    async def node(state):
+        started = time.perf_counter()
+        try:
+            result = await fn(state)
+        except Exception:
+            graph_node_errors.inc(node=name)
+            graph_node_duration.observe(time.perf_counter() - started, node=name)
+            raise
+        graph_node_duration.observe(time.perf_counter() - started, node=name)
+        return result
+    node.__name__ = getattr(fn, '__name__', name)
+    node.__doc__ = fn.__doc__
+    return node
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência e contagem por rota (template do path, não a URL)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            http_requests.inc(route=path, method=scope['method'], status=status['code'])
+            http_request_duration.observe(time.perf_counter() - started, route=path, method=scope['method'])
+
+
+# --- Collectors: contadores que já existem em outros módulos (import tardio evita ciclos) ---
+
+@registry.collector
+def _llm_cache_metrics():
+    from services.llm_cache import llm_cache
+    st = llm_cache.stats()
+    yield ('llm_cache_requests_total', 'counter', 'Consultas ao cache do LLM por resultado.',
+           [({'result': r}, st[r]) for r in ('hits', 'misses', 'bypassed')])
+    yield ('llm_cache_tokens_saved_total', 'counter', 'Tokens poupados por hits do cache do LLM.', [({}, st['tokens_saved'])])
+    yield ('llm_cache_evictions_total', 'counter', 'Entradas removidas pelo LRU do cache do LLM.', [({}, st['evictions'])])
+    yield ('llm_cache_entries', 'gauge', 'Entradas no cache do LLM.', [({}, st['entries'])])
+    yield ('llm_cache_hit_ratio', 'gauge', 'Hits / consultas do cache do LLM.', [({}, st['hit_ratio'])])
+
+
+@registry.collector
+def _search_cache_metrics():
+    from services.search import cache_stats
+    stats = cache_stats()
+    yield ('search_cache_requests_total', 'counter', 'Consultas aos caches de busca por resultado.',
+           [({'cache': st['name'], 'result': r}, st[r]) for st in stats for r in ('hits', 'misses', 'coalesced')])
+    yield ('search_cache_entries', 'gauge', 'Entradas nos caches de busca.', [({'cache': st['name']}, st['size']) for st in stats])
+    yield ('search_cache_hit_ratio', 'gauge', 'Hits (incl. coalescidos) / consultas dos caches de busca.',
+           [({'cache': st['name']}, st['hit_ratio']) for st in stats])
+
+
+@registry.collector
+def _llm_token_metrics():
+    from services.tokens import usage_stats
+    usage = usage_stats()
+    yield ('llm_calls_total', 'counter', 'Chamadas ao LLM por nó (incl. hits do cache).',
+           [({'node': node}, v.get('calls', 0)) for node, v in usage.items()])
+    yield ('llm_tokens_total', 'counter', 'Tokens por nó e tipo (prompt, completion, cached = poupados pelo cache).',
+           [({'node': node, 'kind': kind}, v.get(f'{kind}_tokens', 0))
+            for node, v in usage.items() for kind in ('prompt', 'completion', 'cached')])
+
+
+@registry.collector
+def _validator_metrics():
+    from agents.validators import validator_stats
+    st = validator_stats.stats()
+    yield ('validator_runs_total', 'counter', 'Rascunhos conferidos pelas regras locais por resultado.',
+           [({'result': 'passed'}, st['passed']), ({'result': 'rejected'}, st['rejected'])])
+    yield ('validator_llm_reviews_avoided_total', 'counter', 'Chamadas do Revisor evitadas pelas regras locais.',
+           [({}, st['llm_reviews_avoided'])])
+    yield ('validator_rule_total', 'counter', 'Correções e reprovações por regra.',
+           [({'rule': rule, 'action': action}, n) for rule, counts in st['by_rule'].items() for action, n in counts.items()])
+
+
+@registry.collector
+def _job_metrics():
+    from services.jobs import job_queue
+    yield ('jobs_pending', 'gauge', 'Jobs de geração aguardando na fila.', [({}, job_queue.pending())])
+
+
+def render() -> str:
+    return registry.render()
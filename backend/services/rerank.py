@@ -0,0 +1,188 @@
+import hashlib
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.text import tokenize
+
+RERANK_DIMS = int(os.getenv('RERANK_DIMS', '1024'))
+RERANK_TEXT_FIELDS = ('title', 'summary', 'citation', 'full_text')
+
+
+def _features(text: str) -> List[str]:
+    tokens = tokenize(text)
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class SemanticReranker:
+    """Vetores TF-IDF com hashing (unigramas + bigramas) mantidos numa matriz NumPy.
+
+    A matriz guarda só o tf sublinear por documento; idf e normas são derivados
+    quando o corpus muda. A sincronização roda a cada recarga do JurisprudenceIndex
+    (versão com `updated_at` ou idade máxima), então linhas editadas também são
+    re-vetorizadas. As linhas ficam num buffer com capacidade que cresce
+    geometricamente (`_tf` é a visão das linhas em uso), então uma carga completa
+    copia a matriz O(log n) vezes em vez de uma vez por página. `prepare`/`apply` atualizam só as linhas cujo conteúdo mudou.
+    `rank()` pontua candidatos por cosseno com um único produto matriz-vetor e
+    aplica MMR para diversificar o top-k.
+    """
+
+    def __init__(self, dims: int = RERANK_DIMS):
+        self.dims = dims
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._digest: Dict[str, str] = {}
+        self._buf = np.zeros((0, dims), dtype=np.float32)
+        self._tf = self._buf[:0]
+        self._df = np.zeros(dims, dtype=np.float64)
+        self._idf: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._seen: set = set()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def reserve(self, rows: int):
+        """Garante capacidade para `rows` documentos (ex.: contagem da tabela antes da carga)."""
+        if rows > self._buf.shape[0]:
+            n = len(self._ids)
+            buf = np.empty((rows, self.dims), dtype=np.float32)
+            buf[:n] = self._tf
+            self._buf = buf
+            self._tf = buf[:n]
+
+    def vectorize(self, text: str) -> np.ndarray:
+        feats = _features(text)
+        vec = np.zeros(self.dims, dtype=np.float32)
+        if not feats:
+            return vec
+        idx = np.fromiter((zlib.crc32(f.encode()) % self.dims for f in feats), dtype=np.int64, count=len(feats))
+        counts = np.bincount(idx, minlength=self.dims).astype(np.float32)
+        np.log1p(counts, out=vec)
+        return vec
+
+    # --- sincronização incremental ---
+
+    def begin_sync(self):
+        self._seen = set()
+
+    def prepare(self, rows: Iterable[dict]) -> List[tuple]:
+        """Vetoriza só as linhas novas ou alteradas (comparando o hash do conteúdo).
+
+        Não altera o estado: pode rodar fora do event loop; o resultado vai para `apply()`.
+        """
+        changes = []
+        for row in rows:
+            doc_id = row.get('id')
+            if doc_id is None:
+                continue
+            text = '\n'.join(str(row.get(f) or '') for f in RERANK_TEXT_FIELDS)
+            digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+            if self._digest.get(doc_id) == digest:
+                changes.append((doc_id, None, None))
+            else:
+                changes.append((doc_id, digest, self.vectorize(text)))
+        return changes
+
+    def apply(self, changes: List[tuple]) -> int:
+        """Aplica o resultado de `prepare()`; retorna quantas linhas foram (re)vetorizadas."""
+        new_ids, new_vecs = [], []
+        updated = 0
+        for doc_id, digest, vec in changes:
+            self._seen.add(doc_id)
+            if vec is None or self._digest.get(doc_id) == digest:
+                continue
+            self._digest[doc_id] = digest
+            updated += 1
+            if doc_id in self._pos:
+                i = self._pos[doc_id]
+                self._df -= self._tf[i] > 0
+                self._tf[i] = vec
+                self._df += vec > 0
+            else:
+                new_ids.append(doc_id)
+                new_vecs.append(vec)
+                self._df += vec > 0
+            self._idf = None
+
+        if new_ids:
+            start = len(self._ids)
+            end = start + len(new_ids)
+            if end > self._buf.shape[0]:
+                self.reserve(max(end, 2 * self._buf.shape[0]))
+            self._buf[start:end] = new_vecs
+            self._tf = self._buf[:end]
+            for offset, doc_id in enumerate(new_ids):
+                self._pos[doc_id] = start + offset
+            self._ids.extend(new_ids)
+        return updated
+
+    def end_sync(self) -> int:
+        """Remove documentos que não apareceram desde `begin_sync()` (apagados na tabela); retorna quantos."""
+        gone = [doc_id for doc_id in self._ids if doc_id not in self._seen]
+        if gone:
+            drop = np.array([self._pos[d] for d in gone])
+            self._df -= (self._tf[drop] > 0).sum(axis=0)
+            keep = np.setdiff1d(np.arange(len(self._ids)), drop)
+            self._buf[:keep.size] = self._tf[keep]
+            self._tf = self._buf[:keep.size]
+            self._ids = [self._ids[i] for i in keep]
+            self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            for doc_id in gone:
+                self._digest.pop(doc_id, None)
+            self._idf = None
+        self._seen = set()
+        return len(gone)
+
+    def _weights(self):
+        if self._idf is None:
+            n = len(self._ids)
+            self._idf = (np.log((1 + n) / (1 + self._df)) + 1).astype(np.float32)
+            norms = np.sqrt(np.einsum('ij,ij,j->i', self._tf, self._tf, self._idf ** 2))
+            norms[norms == 0] = 1.0
+            self._norms = norms.astype(np.float32)
+        return self._idf, self._norms
+
+    # --- ranking ---
+
+    def rank(self, query: str, candidate_ids: Optional[Sequence[str]] = None, k: int = 3,
+             mmr_lambda: float = 0.7) -> List[Tuple[str, float]]:
+        """Top-k (id, cosseno) por MMR entre os candidatos (ou o corpus inteiro)."""
+        if not self._ids:
+            return []
+        idf, norms = self._weights()
+        q = self.vectorize(query) * idf
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            return []
+        q /= q_norm
+
+        if candidate_ids is None:
+            rows = np.arange(len(self._ids))
+        else:
+            rows = np.array([self._pos[c] for c in candidate_ids if c in self._pos], dtype=np.int64)
+            if rows.size == 0:
+                return []
+
+        # cosseno(doc, q) = (tf · (idf ∘ q)) / ||tf ∘ idf||
+        sims = (self._tf[rows] @ (q * idf)) / norms[rows]
+
+        if mmr_lambda >= 1.0 or k <= 1:
+            order = np.argsort(-sims)[:k]
+            return [(self._ids[rows[i]], float(sims[i])) for i in order]
+
+        selected: List[int] = []
+        remaining = list(range(rows.size))
+        cand = self._tf[rows] * idf / norms[rows][:, None]
+        while remaining and len(selected) < k:
+            if selected:
+                redundancy = (cand[remaining] @ cand[selected].T).max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining), dtype=np.float32)
+            mmr = mmr_lambda * sims[remaining] - (1 - mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(mmr))]
+            selected.append(best)
+            remaining.remove(best)
+        return [(self._ids[rows[i]], float(sims[i])) for i in selected]
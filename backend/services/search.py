@@ -2,38 +2,138 @@ import os
 import asyncio
 import re
 from dotenv import load_dotenv
-from supabase import create_client
+from services.database import get_supabase
+from services.jurisdiction_index import JurisdictionIndex
+from services.jurisprudence_index import JurisprudenceIndex
+from services.cache import AsyncTTLCache
+from services.text import fold
+from services.tracing import annotate, traced
 
 load_dotenv()
 
-async def get_supabase_client():
-    url = os.getenv('SUPABASE_URL')
-    key = os.getenv('SUPABASE_KEY')
-    if not url or not key:
-        raise ValueError("Supabase configuration missing (SUPABASE_URL/SUPABASE_KEY)")
-    return create_client(url, key)
+# Índice de competência compartilhado pelo processo (ver services/jurisdiction_index.py)
+jurisdiction_index = JurisdictionIndex(get_supabase)
+# Índice BM25 de jurisprudências (ver services/jurisprudence_index.py)
+jurisprudence_index = JurisprudenceIndex(get_supabase)
 
-async def search_jurisprudence(query: str) -> list:
-    """Busca jurisprudência na tabela 'jurisprudences' do Supabase"""
+# Caches TTL/LRU com single-flight na frente das buscas. O TTL nunca passa do
+# intervalo de verificação de versão do índice, então o cache atrasa no máximo um
+# TTL em relação ao índice. Escritas feitas fora deste processo (SQL direto, outro
+# worker) chegam ao índice quando a versão muda (contagem + updated_at) ou, sem
+# updated_at no banco, na recarga por idade (INDEX_MAX_AGE_SECONDS).
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '60'))
+jurisprudence_cache = AsyncTTLCache(
+    'jurisprudence',
+    maxsize=int(os.getenv('SEARCH_CACHE_SIZE', '1024')),
+    ttl=min(SEARCH_CACHE_TTL, jurisprudence_index.check_interval),
+)
+jurisdiction_cache = AsyncTTLCache(
+    'jurisdiction',
+    maxsize=int(os.getenv('SEARCH_CACHE_SIZE', '1024')),
+    ttl=min(SEARCH_CACHE_TTL, jurisdiction_index.check_interval),
+)
+
+# Re-ranking: quantos candidatos do BM25 e o peso relevância x diversidade do MMR
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))
+RERANK_MMR_LAMBDA = float(os.getenv('RERANK_MMR_LAMBDA', '0.7'))
+
+def invalidate_jurisprudence():
+    """Chamado pelas rotas admin que alteram 'jurisprudences'."""
+    jurisprudence_index.invalidate()
+    jurisprudence_cache.invalidate()
+
+def invalidate_jurisdiction(state: str = None):
+    """Chamado pelas rotas admin de competência; com `state`, limpa só as chaves daquela UF."""
+    jurisdiction_index.invalidate()
+    if state:
+        uf = state.strip().upper()
+        jurisdiction_cache.invalidate(lambda key: key[0] == uf)
+    else:
+        jurisdiction_cache.invalidate()
+
+def cache_stats() -> list:
+    return [jurisprudence_cache.stats(), jurisdiction_cache.stats()]
+
+async def _rank_jurisprudence(query: str, limit: int) -> list:
+    await jurisprudence_index.ensure_fresh()
+    results = []
+    for score, item in jurisprudence_index.search(query, k=limit):
+        results.append({
+            "id": item.get("id"),
+            "title": item.get("title"),
+            "snippet": item.get("summary") or item.get("citation"),
+            "link": item.get("source_url"),
+            "score": round(score, 4)
+        })
+    return results
+
+@traced()
+async def search_jurisprudence(query: str, limit: int = 3) -> list:
+    """Busca jurisprudência por relevância (BM25 em memória sobre a tabela 'jurisprudences')"""
     try:
-        supabase = await get_supabase_client()
-        # Busca textual simples nos campos principais
-        # Nota: Usamos ilike para busca case-insensitive simplificada
-        res = supabase.table('jurisprudences').select('*').or_(f"title.ilike.%{query}%,summary.ilike.%{query}%,full_text.ilike.%{query}%").limit(3).execute()
-        
-        data = getattr(res, 'data', [])
-        results = []
-        for item in data:
-            results.append({
-                "title": item.get("title"),
-                "snippet": item.get("summary") or item.get("citation"),
-                "link": item.get("source_url")
-            })
-        return results
+        key = (fold(query), limit)
+        results = await jurisprudence_cache.get_or_load(key, lambda: _rank_jurisprudence(query, limit))
+        return [dict(r) for r in results]
     except Exception as e:
         print(f"❌ Erro na busca de jurisprudência Supabase: {e}")
         return []
 
+@traced()
+async def search_relevant_jurisprudence(query: str, facts: str, k: int = 3, candidates: int = None) -> list:
+    """BM25 traz os candidatos de `query`; o re-ranking TF-IDF/MMR escolhe os k mais próximos dos fatos.
+
+    Sem candidatos do BM25, o re-ranking roda sobre o corpus inteiro.
+    """
+    candidates = candidates or RERANK_CANDIDATES
+    pool = await search_jurisprudence(query, limit=candidates)
+    if not facts or not facts.strip():
+        return pool[:k]
+    try:
+        ids = [r['id'] for r in pool] or None
+        ranked = jurisprudence_index.vectors.rank(facts, ids, k=k, mmr_lambda=RERANK_MMR_LAMBDA)
+        by_id = {r['id']: r for r in pool}
+        results = []
+        for doc_id, similarity in ranked:
+            item = by_id.get(doc_id)
+            if item is None:
+                doc = jurisprudence_index.get(doc_id) or {}
+                item = {
+                    "id": doc_id,
+                    "title": doc.get("title"),
+                    "snippet": doc.get("summary") or doc.get("citation"),
+                    "link": doc.get("source_url"),
+                }
+            results.append({**item, "similarity": round(similarity, 4)})
+        return results or pool[:k]
+    except Exception as e:
+        print(f"❌ Erro no re-ranking de jurisprudência: {e}")
+        return pool[:k]
+
+def extract_address_candidates(user_address: str, state: str = None):
+    """Regras de parsing do endereço: retorna (UF extraída, partes candidatas a município)"""
+    # Extrai o estado (ex: "PA") - Busca por 2 letras isoladas no final ou após hífen/vírgula
+    clean_addr = (user_address or "").strip()
+    state_match = re.search(r"[\s,\-/]([A-Za-z]{2})\s*$", clean_addr)
+    extracted_state = state_match.group(1).upper() if state_match else (state.upper() if state else None)
+
+    # Fallback para regex mais simples se falhar
+    if not extracted_state:
+        state_match = re.search(r"([A-Za-z]{2})\s*$", clean_addr)
+        extracted_state = state_match.group(1).upper() if state_match else None
+
+    if not extracted_state:
+        return None, []
+
+    # Divide o endereço por vírgulas, hifens ou barras e remove espaços
+    parts = [p.strip() for p in re.split(r'[,/\-]', user_address or "")]
+    # Filtra partes muito curtas ou que pareçam ser o estado
+    parts = [p for p in parts if len(p) > 2 and p.upper() != extracted_state]
+    return extracted_state, parts
+
+def jurisdiction_not_found(state: str = None) -> dict:
+    return { "city": "Não localizada", "state": (state or ""), "has_jef": True, "subsecao": "Não localizada" }
+
+@traced()
 async def search_judicial_subsection(user_address: str, city: str = None, state: str = None) -> dict:
     """Busca a subseção judiciária (Fórum/Subseção) usando dados estruturados ou endereço"""
     
@@ -47,24 +147,10 @@ async def search_judicial_subsection(user_address: str, city: str = None, state:
     # 2. Caso contrário, tenta extrair do endereço (como plano de fallback)
     print(f"🔍 [Search] Analisando endereço para jurisdição: '{user_address}'")
     try:
-        # Extrai o estado (ex: "PA") - Busca por 2 letras isoladas no final ou após hífen/vírgula
-        clean_addr = (user_address or "").strip()
-        state_match = re.search(r"[\s,\-/]([A-Za-z]{2})\s*$", clean_addr)
-        extracted_state = state_match.group(1).upper() if state_match else (state.upper() if state else None)
-        
-        # Fallback para regex mais simples se falhar
-        if not extracted_state:
-            state_match = re.search(r"([A-Za-z]{2})\s*$", clean_addr)
-            extracted_state = state_match.group(1).upper() if state_match else None
-
+        extracted_state, parts = extract_address_candidates(user_address, state)
         print(f"📍 [Search] Estado extraído: {extracted_state}")
         
         if extracted_state:
-            # Divide o endereço por vírgulas, hifens ou barras e remove espaços
-            parts = [p.strip() for p in re.split(r'[,/\-]', user_address or "")]
-            # Filtra partes muito curtas ou que pareçam ser o estado
-            parts = [p for p in parts if len(p) > 2 and p.upper() != extracted_state]
-            
             print(f"📋 [Search] Partes candidatas a município: {parts}")
             
             # Tenta encontrar no banco de dados, começando do fim do endereço
@@ -78,67 +164,48 @@ async def search_judicial_subsection(user_address: str, city: str = None, state:
         print(f"⚠️ Erro no lookup de jurisdição: {e}")
 
     print("❌ [Search] Jurisdição não localizada.")
-    return { "city": "Não localizada", "state": (state or ""), "has_jef": True, "subsecao": "Não localizada" }
+    return jurisdiction_not_found(state)
+
+def resolve_judicial_subsection_local(user_address: str, city: str = None, state: str = None) -> dict:
+    """Mesmas regras de search_judicial_subsection, resolvidas só contra o índice já carregado"""
+    if city and state:
+        db = jurisdiction_index.resolve(city, state)
+        if db.get('found'):
+            return db
+
+    extracted_state, parts = extract_address_candidates(user_address, state)
+    if extracted_state:
+        for part in reversed(parts):
+            db = jurisdiction_index.resolve(part, extracted_state)
+            if db.get('found'):
+                return db
+
+    return jurisdiction_not_found(state)
 
+async def search_judicial_subsections_batch(items: list) -> list:
+    """Resolve vários endereços de uma vez: uma verificação do índice e nenhuma consulta por item"""
+    await jurisdiction_index.ensure_fresh()
+    results = []
+    for item in items:
+        try:
+            results.append(resolve_judicial_subsection_local(
+                item.get('address'), city=item.get('city'), state=item.get('state')
+            ))
+        except Exception as e:
+            results.append({ 'error': str(e) })
+    return results
+
+@traced()
 async def search_jurisdiction_db(municipality: str, state: str) -> dict:
+    annotate(municipality=municipality, state=state)
     try:
         if not municipality or not state:
             return { 'found': False }
 
-        supabase = await get_supabase_client()
-        cleaned_mun = municipality.strip().lower()
-        state_upper = state.upper()
-
-        # 1. Busca todos os municípios do estado
-        mun_q = supabase.table('municipalities').select('id, name').eq('state', state_upper).execute()
-        all_mun = getattr(mun_q, 'data', [])
-        
-        target_mun_id = None
-        target_mun_name = None
-        
-        # Tenta encontrar o município (match exato primeiro)
-        for m in all_mun:
-            m_name = m['name'].lower()
-            if m_name == cleaned_mun:
-                target_mun_id = m['id']
-                target_mun_name = m['name']
-                break
-        
-        # Se não achou exato, tenta conter (fuzzy match simples)
-        if not target_mun_id:
-            for m in all_mun:
-                m_name = m['name'].lower()
-                if m_name in cleaned_mun or cleaned_mun in m_name:
-                    target_mun_id = m['id']
-                    target_mun_name = m['name']
-                    break
-        
-        if not target_mun_id:
-            return { 'found': False }
-
-        # 2. Busca o mapeamento de jurisdição
-        res = supabase.table('jurisdiction_map').select(
-            'legal_basis, subsection:subsection_id(name,city,has_jef, judicial_sections(name))'
-        ).eq('municipality_id', target_mun_id).limit(1).execute()
-        
-        data = getattr(res, 'data', [])
-        
-        if data and len(data) > 0:
-            row = data[0]
-            subsection = row.get('subsection', {})
-            section_data = subsection.get('judicial_sections', {})
-            
-            return {
-                'found': True,
-                'municipio': target_mun_name,
-                'state': state_upper,
-                'subsecao': subsection.get('name'),
-                'city': subsection.get('city'),
-                'has_jef': subsection.get('has_jef'),
-                'section': section_data.get('name') if isinstance(section_data, dict) else None,
-                'legal_basis': row.get('legal_basis')
-            }
-        
-        return { 'found': False }
+        # Resolução local: o índice carrega municípios + mapeamentos uma vez por processo
+        key = (state.strip().upper(), fold(municipality))
+        result = await jurisdiction_cache.get_or_load(key, lambda: jurisdiction_index.lookup(municipality, state))
+        annotate(found=bool(result.get('found')))
+        return dict(result)
     except Exception as e:
         return { 'error': str(e) }
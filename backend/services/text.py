@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+
+def fold(value) -> str:
+    """Normaliza texto para comparação: sem acentos, sem caixa e com espaços colapsados."""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+# --- Tokenização para busca (Português, sem acentos) ---
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela dele do dos e ela ele em entre era essa esse esta este eu foi
+ha isso isto ja la lhe mais mas me mesmo na nao nas nem no nos o os ou para pela pelas pelo pelos por
+qual quando que quem se sem ser seu sua sao so tambem te tem um uma umas uns sobre art n
+""".split())
+
+_PLURAL = (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+           ('ns', 'm'), ('res', 'r'), ('zes', 'z'), ('les', 'l'), ('is', 'il'))
+_FEMININE = (('ona', 'ao'), ('ora', 'or'), ('inha', 'inho'), ('esa', 'es'), ('osa', 'oso'),
+             ('ica', 'ico'), ('ada', 'ado'), ('ida', 'ido'), ('iva', 'ivo'), ('eira', 'eiro'))
+_NOUN = ('adoria', 'amento', 'imento', 'mente', 'acao', 'icao', 'ucao', 'idade', 'ancia', 'encia',
+         'ismo', 'ista', 'avel', 'ivel', 'aria', 'oria', 'ador', 'edor', 'idor', 'ante',
+         'ente', 'ico', 'ivo', 'oso', 'eiro', 'ao')
+_VERB = ('ariam', 'eriam', 'iriam', 'aram', 'eram', 'iram', 'avam', 'ando', 'endo', 'indo',
+         'ava', 'ado', 'ido', 'ar', 'er', 'ir', 'ou', 'am', 'em')
+
+
+def _strip(word: str, suffixes, min_stem: int = 3):
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[:-len(suffix)], True
+    return word, False
+
+
+@lru_cache(maxsize=200_000)
+def stem_pt(word: str) -> str:
+    """Stemmer leve no estilo RSLP: plural, feminino, sufixos nominais/verbais e vogal final."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('s'):
+        for suffix, repl in _PLURAL:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+                word = word[:-len(suffix)] + repl
+                break
+        else:
+            word = word[:-1]
+    for suffix, repl in _FEMININE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            word = word[:-len(suffix)] + repl
+            break
+    word, removed = _strip(word, _NOUN)
+    if not removed:
+        word, _ = _strip(word, _VERB)
+    if len(word) > 3 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text) -> list:
+    """Texto -> termos normalizados (sem acento/caixa), sem stopwords e com stemming."""
+    return [stem_pt(t) for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
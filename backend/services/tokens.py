@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# Contagem de tokens dos prompts (tiktoken) e orçamento por seção.
+# Sem o arquivo do encoding (ambiente offline), cai numa estimativa por caracteres.
+TOKEN_MODEL = os.getenv('TOKEN_MODEL', 'gpt-4o')
+CHARS_PER_TOKEN = 4
+TRIM_MARKER = ' […]'
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str = TOKEN_MODEL):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        print(f"⚠️ [Tokens] Encoding indisponível ({e}); usando estimativa por caracteres.")
+        return None
+
+
+def count_tokens(text, model: str = TOKEN_MODEL) -> int:
+    if not text:
+        return 0
+    text = str(text)
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def trim_to_tokens(text, max_tokens: int, model: str = TOKEN_MODEL) -> str:
+    """Corta `text` em até `max_tokens` (contando o marcador de corte). Determinístico."""
+    text = '' if text is None else str(text)
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(TRIM_MARKER, model), 0)
+    enc = _encoding(model)
+    if enc is None:
+        head = text[:keep * CHARS_PER_TOKEN]
+    else:
+        head = enc.decode(enc.encode(text, disallowed_special=())[:keep])
+    return head.rstrip() + TRIM_MARKER
+
+
+def trim_lines(text, max_tokens: int, line_tokens: Optional[int] = None, model: str = TOKEN_MODEL) -> str:
+    """Limita cada linha a `line_tokens` e descarta as últimas linhas até caber em `max_tokens`.
+
+    Serve para listas ordenadas por relevância (ex.: jurisprudências): o que sai
+    primeiro é o final da lista.
+    """
+    lines = str(text or '').splitlines()
+    if line_tokens:
+        lines = [trim_to_tokens(line, line_tokens, model) for line in lines]
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line + '\n', model)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if not kept and lines:
+        return trim_to_tokens(lines[0], max_tokens, model)
+    return '\n'.join(kept)
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == '' or value == [] or value == {}
+
+
+def _compact(value):
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items() if not _is_empty(v)}
+    if isinstance(value, list):
+        return [_compact(v) for v in value if not _is_empty(v)]
+    return value
+
+
+def compact_json(data: dict, max_tokens: int, drop_order: Tuple[str, ...] = (), model: str = TOKEN_MODEL) -> str:
+    """JSON sem campos vazios; acima do orçamento remove campos na ordem de `drop_order`.
+
+    Se ainda não couber, o texto é cortado no fim.
+    """
+    data = _compact(dict(data or {}))
+    dump = json.dumps(data, ensure_ascii=False)
+    for key in drop_order:
+        if count_tokens(dump, model) <= max_tokens:
+            break
+        if key in data:
+            data.pop(key)
+            dump = json.dumps(data, ensure_ascii=False)
+    return trim_to_tokens(dump, max_tokens, model)
+
+
+def fit_sections(sections: List[Tuple[str, str, int]], total_budget: int,
+                 model: str = TOKEN_MODEL) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Aplica orçamento por seção e depois o total.
+
+    `sections`: (nome, texto, orçamento) em ordem de prioridade decrescente;
+    orçamento <= 0 significa seção fixa (não cortada). Se o total passar de
+    `total_budget`, as seções de menor prioridade (últimas) são cortadas primeiro.
+    Retorna (textos por seção, tokens por seção).
+    """
+    texts, counts = {}, {}
+    for name, text, budget in sections:
+        text = '' if text is None else str(text)
+        if budget > 0:
+            text = trim_to_tokens(text, budget, model)
+        texts[name] = text
+        counts[name] = count_tokens(text, model)
+
+    excess = sum(counts.values()) - total_budget
+    for name, _, budget in reversed(sections):
+        if excess <= 0:
+            break
+        if budget <= 0 or not counts[name]:
+            continue
+        target = max(counts[name] - excess, 0)
+        texts[name] = trim_to_tokens(texts[name], target, model)
+        excess -= counts[name] - count_tokens(texts[name], model)
+        counts[name] = count_tokens(texts[name], model)
+    return texts, counts
+
+
+# --- Uso real reportado pelo modelo (por nó) ---
+
+_usage_lock = threading.Lock()
+_usage_totals: Dict[str, Dict[str, int]] = {}
+
+
+def merge_usage(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer do estado do grafo: soma o uso de tokens por nó."""
+    merged = {node: dict(values) for node, values in (left or {}).items()}
+    for node, values in (right or {}).items():
+        target = merged.setdefault(node, {})
+        for key, value in values.items():
+            target[key] = target.get(key, 0) + value
+    return merged
+
+
+def record_usage(node: str, usage: dict):
+    """Acumula o uso do processo inteiro e registra no log."""
+    with _usage_lock:
+        totals = _usage_totals.setdefault(node, {})
+        for key, value in usage.items():
+            totals[key] = totals.get(key, 0) + value
+    print(f"📏 [Tokens] {node}: prompt={usage.get('prompt_tokens', 0)} "
+          f"completion={usage.get('completion_tokens', 0)} cache={usage.get('cached_tokens', 0)}")
+
+
+def usage_stats() -> Dict[str, Dict[str, int]]:
+    with _usage_lock:
+        return {node: dict(values) for node, values in _usage_totals.items()}
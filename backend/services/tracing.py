@@ -0,0 +1,318 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from services.executor import run_blocking
+from services.metrics import supabase_table
+
+# Tracing por requisição: cada requisição HTTP (ou job da fila) vira um Trace com
+# uma árvore de spans (chamadas ao Supabase, funções de serviço, nós do grafo,
+# chamadas ao LLM). O id de correlação vem/vai no cabeçalho X-Request-ID; como ele
+# pode ser repetido pelo cliente, cada Trace também recebe um `trace_id` único,
+# que é a chave do buffer. Os traces recentes ficam num buffer circular
+# (GET /api/debug/traces) e, com TRACE_EXPORT_PATH, também são gravados em JSON lines.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '2000'))
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+TRACE_EXCLUDE_PATHS = tuple(p for p in os.getenv('TRACE_EXCLUDE_PATHS', '/metrics,/api/debug').split(',') if p)
+REQUEST_ID_HEADER = 'X-Request-ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._\-]{1,128}$')
+
+_current_trace: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('span', default=None)
+
+
+class Span:
+    __slots__ = ('id', 'parent_id', 'name', 'attrs', 'start', 'end', 'error')
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attrs: dict):
+        self.id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+
+
+class Trace:
+    def __init__(self, request_id: str, name: str, **attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.root = self.open(name, None, dict(attrs))
+
+    def open(self, name: str, parent: Optional[Span], attrs: dict) -> Optional[Span]:
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = Span(len(self.spans), parent.id if parent else None, name, attrs)
+        self.spans.append(span)
+        return span
+
+    def _ms(self, t: Optional[float]) -> Optional[float]:
+        return None if t is None else round((t - self.root.start) * 1000, 2)
+
+    def summary(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'request_id': self.request_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': self._ms(self.root.end),
+            'spans': len(self.spans),
+            'error': self.root.error,
+            **{k: v for k, v in self.root.attrs.items() if k in ('status', 'route')},
+        }
+
+    def to_dict(self) -> dict:
+        """Árvore de spans; `start_ms` é relativo ao início do trace."""
+        nodes = {}
+        for s in self.spans:
+            nodes[s.id] = {
+                'name': s.name,
+                'start_ms': self._ms(s.start),
+                'duration_ms': None if s.end is None else round((s.end - s.start) * 1000, 2),
+                'attrs': s.attrs,
+                'error': s.error,
+                'children': [],
+            }
+        for s in self.spans[1:]:
+            parent = nodes.get(s.parent_id, nodes[0])
+            parent['children'].append(nodes[s.id])
+        return {**self.summary(), 'dropped_spans': self.dropped, 'root': nodes[0]}
+
+
+# --- Spans ---
+
+class span:
+    """Context manager (sync e async) que abre um span filho do span atual.
+
+    Sem trace ativo não faz nada, então pode envolver qualquer código.
+    """
+    __slots__ = ('name', 'attrs', '_span', '_token')
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._span = None
+        self._token = None
+
+    def __enter__(self) -> Optional[Span]:
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        self._span = trace.open(self.name, _current_span.get(), self.attrs)
+        if self._span is not None:
+            self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            _current_span.reset(self._token)
+            self._span.finish(exc)
+        return False
+
+    async def __aenter__(self) -> Optional[Span]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: cada chamada da função (sync ou async) vira um span."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def annotate(**attrs):
+    """Adiciona atributos ao span atual (se houver)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+# --- Buffer circular e exportação ---
+
+class TraceBuffer:
+    def __init__(self, maxsize: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_EXPORT_PATH):
+        self.maxsize = maxsize
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        self._traces: 'OrderedDict[str, Trace]' = OrderedDict()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.maxsize:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        """Busca pelo `trace_id`; sem ele, o trace mais recente com esse X-Request-ID (ou id de job)."""
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            if trace is not None:
+                return trace
+            return next((t for t in reversed(self._traces.values()) if t.request_id == trace_id), None)
+
+    def by_request_id(self, request_id: str) -> List[Trace]:
+        with self._lock:
+            return [t for t in reversed(self._traces.values()) if t.request_id == request_id]
+
+    def recent(self, limit: int = 50) -> List[Trace]:
+        with self._lock:
+            return list(self._traces.values())[-limit:][::-1]
+
+    def export(self, trace: Trace):
+        """Acrescenta o trace como uma linha JSON em `export_path` (bloqueante; rodar via run_blocking)."""
+        if not self.export_path:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if os.path.dirname(self.export_path):
+                os.makedirs(os.path.dirname(self.export_path), exist_ok=True)
+            with open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+trace_buffer = TraceBuffer()
+
+
+async def export_trace(trace: Trace):
+    if not trace_buffer.export_path:
+        return
+    try:
+        await run_blocking(trace_buffer.export, trace)
+    except Exception as e:
+        print(f"⚠️ [Tracing] Falha ao exportar trace {trace.request_id}: {e}")
+
+
+class trace_context:
+    """Abre um Trace para o bloco (requisição, job). Ao sair, vai para o buffer."""
+
+    def __init__(self, request_id: Optional[str], name: str, **attrs):
+        self.request_id = request_id if request_id and _VALID_REQUEST_ID.match(request_id) else uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.trace: Optional[Trace] = None
+        self._tokens = None
+
+    def __enter__(self) -> Trace:
+        self.trace = Trace(self.request_id, self.name, **self.attrs)
+        self._tokens = (_current_trace.set(self.trace), _current_span.set(self.trace.root))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._tokens[1])
+        _current_trace.reset(self._tokens[0])
+        self.trace.root.finish(exc)
+        trace_buffer.add(self.trace)
+        return False
+
+
+# --- Supabase (event hooks do httpx) ---
+
+async def _on_supabase_request(request):
+    trace = _current_trace.get()
+    if trace is not None:
+        request.extensions['trace_span'] = trace.open(
+            f'supabase.{supabase_table(request.url)}', _current_span.get(), {'method': request.method}
+        )
+
+
+async def _on_supabase_response(response):
+    s = response.request.extensions.get('trace_span')
+    if s is not None:
+        s.set(status=response.status_code)
+        s.finish()
+
+
+def supabase_trace_hooks() -> dict:
+    if not TRACING_ENABLED:
+        return {}
+    return {'request': [_on_supabase_request], 'response': [_on_supabase_response]}
+
+
+# --- Middleware ---
+
+class TracingMiddleware:
+    """Middleware ASGI: um Trace por requisição, correlacionado pelo X-Request-ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not TRACING_ENABLED:
+            return await self.app(scope, receive, send)
+
+        if scope['path'].startswith(TRACE_EXCLUDE_PATHS):
+            return await self.app(scope, receive, send)
+        incoming = None
+        for key, value in scope.get('headers') or ():
+            if key == b'x-request-id':
+                incoming = value.decode('latin-1')
+                break
+
+        ctx = trace_context(incoming, f"http {scope['method']} {scope['path']}", method=scope['method'], path=scope['path'])
+
+        with ctx as trace:
+            async def send_wrapper(message):
+                if message['type'] == 'http.response.start':
+                    trace.root.set(status=message['status'])
+                    headers = list(message.get('headers') or [])
+                    headers.append((REQUEST_ID_HEADER.lower().encode(), trace.request_id.encode()))
+                    message = {**message, 'headers': headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except Exception:
+                # o 500 de exceções não tratadas é montado pelo ServerErrorMiddleware, fora deste middleware
+                if 'status' not in trace.root.attrs:
+                    trace.root.set(status=500)
+                raise
+            finally:
+                route = getattr(scope.get('route'), 'path', None)
+                if route:
+                    trace.root.set(route=route)
+        await export_trace(trace)
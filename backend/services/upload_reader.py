@@ -0,0 +1,60 @@
+import csv
+import io
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Iterator, List, Tuple
+
+from services.executor import run_blocking
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+# Leitura incremental de uploads: as linhas saem direto do arquivo temporário do
+# UploadFile (SpooledTemporaryFile), sem materializar o conteúdo inteiro em memória.
+
+
+def iter_csv_rows(fileobj: BinaryIO, encoding: str = 'utf-8-sig') -> Iterator[dict]:
+    text = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        # não deixa o wrapper fechar o arquivo do upload
+        text.detach()
+
+
+def iter_xlsx_rows(fileobj: BinaryIO) -> Iterator[dict]:
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        it = wb.active.iter_rows(values_only=True)
+        try:
+            headers = [str(h).strip() for h in next(it)]
+        except StopIteration:
+            return
+        for r in it:
+            yield {h: (r[i] if i < len(r) else None) for i, h in enumerate(headers)}
+    finally:
+        wb.close()
+
+
+def _take(iterator: Iterator, size: int) -> list:
+    return list(islice(iterator, size))
+
+
+async def iter_upload_batches(fileobj: BinaryIO, batch_size: int, is_excel: bool = False) -> AsyncIterator[List[Tuple[int, dict]]]:
+    """Entrega lotes de (número da linha na planilha, linha) — o cabeçalho é a linha 1.
+
+    A leitura de cada lote roda no pool bloqueante; só um lote fica em memória por vez.
+    """
+    fileobj.seek(0)
+    rows = iter_xlsx_rows(fileobj) if is_excel else iter_csv_rows(fileobj)
+    numbered = ((n + 2, row) for n, row in enumerate(rows))
+    try:
+        while True:
+            batch = await run_blocking(_take, numbered, batch_size)
+            if not batch:
+                return
+            yield batch
+    finally:
+        numbered.close()
+        rows.close()